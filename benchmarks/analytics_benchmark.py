@@ -0,0 +1,61 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Hours per user and month, summed with a loop over the decoded entries and
+# with an EntryTable.
+#
+#     python benchmarks/analytics_benchmark.py [--entries 1000000]
+
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from decode_benchmark import entries_payload
+from harvest.analytics import EntryTable
+
+
+def loop_rollup(entries):
+    totals = defaultdict(float)
+    for entry in entries:
+        entry = entry['day_entry']
+        totals[entry['user_id'], entry['spent_at'][:7]] += entry['hours']
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=1000000)
+    args = parser.parse_args()
+
+    entries = json.loads(entries_payload(args.entries))
+
+    start = time.perf_counter()
+    loop_rollup(entries)
+    print('{0:<12} {1:>10.1f} ms'.format('loop', (time.perf_counter() - start) * 1000))
+
+    start = time.perf_counter()
+    table = EntryTable.from_entries(entries)
+    print('{0:<12} {1:>10.1f} ms'.format('load', (time.perf_counter() - start) * 1000))
+
+    start = time.perf_counter()
+    table.group_by('user', 'month')
+    print('{0:<12} {1:>10.1f} ms'.format('group_by', (time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
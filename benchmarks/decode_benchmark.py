@@ -0,0 +1,85 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Compares parse time and peak memory of the response codecs on a large
+# entry listing, the shape returned by user_hours and
+# timesheets_for_project.
+#
+#     python benchmarks/decode_benchmark.py [--entries 100000] [--repeat 5]
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from harvest import codec
+
+
+def entries_payload(count):
+    entries = []
+    for i in range(count):
+        entries.append({'day_entry': {
+            'id': 100000 + i,
+            'notes': 'Worked on ticket #{0}'.format(i % 977),
+            'spent_at': '2017-{0:02d}-{1:02d}'.format(i % 12 + 1, i % 28 + 1),
+            'hours': round((i % 16) * 0.25 + 0.25, 2),
+            'user_id': 500 + i % 40,
+            'project_id': 2000 + i % 150,
+            'task_id': 3000 + i % 25,
+            'created_at': '2017-01-01T09:00:00Z',
+            'updated_at': '2017-01-01T17:30:00Z',
+            'adjustment_record': False,
+            'timer_started_at': None,
+            'is_closed': False,
+            'is_billed': i % 3 == 0,
+        }})
+    return json.dumps(entries).encode('utf-8')
+
+
+def measure(decoder, payload, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decoder.loads(payload)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = decoder.loads(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payload = entries_payload(args.entries)
+    print('{0} entries, {1:.1f} MB payload'.format(args.entries, len(payload) / 1e6))
+    print('{0:<10} {1:>12} {2:>14}'.format('codec', 'parse (ms)', 'peak mem (MB)'))
+    for name in ('ordered', 'json', 'orjson', 'raw'):
+        if name == 'orjson' and codec.orjson is None:
+            continue
+        seconds, peak = measure(codec.get_codec(name), payload, args.repeat)
+        print('{0:<10} {1:>12.1f} {2:>14.1f}'.format(name, seconds * 1000, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Startup cost in fresh interpreters: the time `import harvest` takes, the
+# wall time of `python -m harvest --help`, and which heavy dependencies the
+# import drags in. Those should only be loaded once they are used.
+#
+#     python benchmarks/import_benchmark.py [--runs 20]
+
+import argparse
+import compileall
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Loaded on first use, never by `import harvest`.
+HEAVY_MODULES = ('requests', 'requests_oauthlib', 'oauthlib', 'urllib3', 'aiohttp', 'asyncio', 'numpy')
+
+_TIMED_IMPORT = ('import sys, time, json; start = time.perf_counter(); import harvest; '
+                 'print(json.dumps([time.perf_counter() - start, sorted(sys.modules)]))')
+
+
+def _compile():
+    # Bytecode may not have been written yet, and compiling is not what
+    # is being measured.
+    compileall.compile_dir(os.path.join(ROOT, 'harvest'), quiet=1)
+
+
+def import_harvest(runs):
+    # Best time over `runs` imports, and the heavy modules loaded.
+    best, modules = float('inf'), []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', _TIMED_IMPORT], cwd=ROOT)
+        seconds, modules = json.loads(output.decode('utf-8'))
+        best = min(best, seconds)
+    return best, [name for name in modules if name.split('.')[0] in HEAVY_MODULES]
+
+
+def cli_help(runs):
+    best = float('inf')
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.check_call([sys.executable, '-m', 'harvest', '--help'], cwd=ROOT, stdout=devnull)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def startup(runs):
+    _compile()
+    seconds, heavy = import_harvest(runs)
+    return {
+        'import_ms': seconds * 1000,
+        'cli_help_ms': cli_help(runs) * 1000,
+        'heavy_modules': len(heavy),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    _compile()
+    seconds, heavy = import_harvest(args.runs)
+    print('import harvest          {0:>8.1f} ms'.format(seconds * 1000))
+    print('python -m harvest --help {0:>7.1f} ms'.format(cli_help(args.runs) * 1000))
+    print('heavy modules loaded     {0}'.format(', '.join(sorted(set(name.split('.')[0] for name in heavy)))
+                                                or 'none'))
+
+
+if __name__ == '__main__':
+    main()
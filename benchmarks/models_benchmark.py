@@ -0,0 +1,54 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Memory held per time entry as decoded dicts, as TimeEntry records and as
+# RecordColumns.
+#
+#     python benchmarks/models_benchmark.py [--entries 100000]
+
+import argparse
+import json
+import sys
+import tracemalloc
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from decode_benchmark import entries_payload
+from harvest.models import model_for, to_models
+
+
+def retained(build, payload):
+    tracemalloc.start()
+    result = build(json.loads(payload))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=100000)
+    args = parser.parse_args()
+
+    payload = entries_payload(args.entries)
+    print('{0:<10} {1:>14}'.format('layout', 'bytes/entry'))
+    for name, build in (('dicts', lambda entries: entries),
+                        ('records', lambda entries: [model_for(entry) for entry in entries]),
+                        ('columns', to_models)):
+        print('{0:<10} {1:>14.0f}'.format(name, retained(build, payload) / float(args.entries)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Measures the request path against the local mock server in
+# harvest.testing: per-call overhead, response decoding, pagination,
+# concurrent fan-out and memory per record, plus startup cost. Results are
+# written as JSON; given a baseline from an earlier run, metrics that got
+# worse by more than the tolerance are listed and the exit status is 1.
+#
+#     python benchmarks/suite.py --output results.json
+#     python benchmarks/suite.py --baseline results.json [--tolerance 0.2]
+#
+# Every metric is lower-is-better.
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from decode_benchmark import entries_payload, measure
+from import_benchmark import startup
+from models_benchmark import retained
+from harvest import Harvest, codec
+from harvest.models import model_for, to_models
+from harvest.testing import MockDataset, MockHarvestServer
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _client(server, **kwargs):
+    return Harvest(server.url, 'bench@example.com', 'secret', rate_limit=None, **kwargs)
+
+
+def single_call(args):
+    samples = []
+    with MockHarvestServer() as server, _client(server) as client:
+        client.who_am_i
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            client.who_am_i
+            samples.append(time.perf_counter() - start)
+    return {
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': _percentile(samples, 0.5) * 1000,
+        'p95_ms': _percentile(samples, 0.95) * 1000,
+    }
+
+
+def decode(args):
+    payload = entries_payload(args.entries)
+    results = {}
+    for name in ('json', 'orjson'):
+        if name == 'orjson' and codec.orjson is None:
+            continue
+        seconds, peak = measure(codec.get_codec(name), payload, args.repeat)
+        results['{0}_ms'.format(name)] = seconds * 1000
+        results['{0}_peak_mb'.format(name)] = peak / 1e6
+    return results
+
+
+def pagination(args):
+    with MockHarvestServer(MockDataset(invoices=args.invoices)) as server, _client(server) as client:
+        start = time.perf_counter()
+        count = sum(1 for _ in client.iter_invoices())
+        elapsed = time.perf_counter() - start
+    return {
+        'total_ms': elapsed * 1000,
+        'us_per_record': elapsed / count * 1e6,
+    }
+
+
+def fan_out(args):
+    ids = list(range(1, args.users + 1))
+    results = {}
+    with MockHarvestServer(MockDataset(people=args.users), latency=args.latency) as server:
+        for name, workers in (('serial', 1), ('concurrent', None)):
+            with _client(server) as client:
+                start = time.perf_counter()
+                for _, _, error in client.hours_for_users(ids, '20170101', '20170107', max_workers=workers):
+                    if error is not None:
+                        raise error
+                results['{0}_ms'.format(name)] = (time.perf_counter() - start) * 1000
+    return results
+
+
+def memory(args):
+    payload = entries_payload(args.entries)
+    results = {}
+    for name, build in (('dicts', lambda entries: entries),
+                        ('records', lambda entries: [model_for(entry) for entry in entries]),
+                        ('columns', to_models)):
+        results['{0}_bytes_per_record'.format(name)] = retained(build, payload) / float(args.entries)
+    return results
+
+
+BENCHMARKS = (
+    ('single_call', single_call),
+    ('decode', decode),
+    ('pagination', pagination),
+    ('fan_out', fan_out),
+    ('memory', memory),
+    ('startup', lambda args: startup(args.runs)),
+)
+
+
+def regressions(results, baseline, tolerance):
+    worse = []
+    for group, metrics in results.items():
+        for name, value in metrics.items():
+            before = baseline.get(group, {}).get(name)
+            if before is not None and value > before * (1 + tolerance):
+                worse.append((group, name, before, value))
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', action='append', choices=[name for name, _ in BENCHMARKS],
+                        help='Run only the named benchmark; may be repeated.')
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--invoices', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='Write the results to this file instead of stdout.')
+    parser.add_argument('--baseline', help='Results of an earlier run to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {}
+    for name, benchmark in BENCHMARKS:
+        if not args.only or name in args.only:
+            results[name] = benchmark(args)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': dict((key, value) for key, value in vars(args).items()
+                           if key not in ('only', 'output', 'baseline', 'tolerance')),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            worse = regressions(results, json.load(f)['results'], args.tolerance)
+        for group, name, before, after in worse:
+            sys.stderr.write('{0}.{1}: {2:.3f} -> {3:.3f}\n'.format(group, name, before, after))
+        if worse:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,15 @@ from .metadata import (
 
 from .harvest import *
 
+
+def __getattr__(name):
+    # AsyncHarvest pulls in asyncio and aiohttp, so it is only imported
+    # when asked for.
+    if name == 'AsyncHarvest':
+        from .aio import AsyncHarvest
+        return AsyncHarvest
+    raise AttributeError("module 'harvest' has no attribute '{0}'".format(name))
+
 __all__ = [
     '__author__', '__copyright__', '__email__', '__license__',
     '__maintainer__', '__version__', 'harvest'
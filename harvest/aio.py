@@ -0,0 +1,390 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .harvest import (
+    HARVEST_STATUS_URL,
+    RETRY_STATUSES,
+    SHARD_RETRIES,
+    STATUS_TIMEOUT,
+    Harvest,
+    HarvestDeadlineError,
+    HarvestError,
+    _check_status,
+    _merge_windows,
+    _page_records,
+    _stream_tail,
+    _with_query,
+    _write_result,
+)
+from .singleflight import AsyncSingleFlight
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+
+class AsyncHarvest(Harvest):
+    # asyncio flavour of Harvest. Every endpoint method is inherited as-is
+    # and returns an awaitable (the iter_* methods return async iterators),
+    # so the two clients build URLs and authenticate the same way:
+    #
+    #     async with AsyncHarvest(uri, email, password) as client:
+    #         projects, people = await asyncio.gather(client.projects(), client.people())
+    #
+    # At most `max_concurrency` requests are on the wire at any time; the
+    # rest wait their turn.
+    def __init__(self, uri, *args, **kwargs):
+        if aiohttp is None:
+            raise HarvestError('AsyncHarvest requires aiohttp: pip install "python-harvest-redux[async]"')
+        self.max_concurrency = kwargs.pop('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        kwargs.setdefault('pool_maxsize', self.max_concurrency)
+        super(AsyncHarvest, self).__init__(uri, *args, **kwargs)
+        self._semaphore = None
+        self._default_params = {}
+        if self.single_flight is not None:
+            self.single_flight = AsyncSingleFlight()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def status(self):
+        return self._status()
+
+    async def _status(self):
+        # A session of its own: the client's would send our credentials to
+        # the status page.
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=STATUS_TIMEOUT)) as session:
+                async with session.get(HARVEST_STATUS_URL) as resp:
+                    status = (await resp.json(content_type=None)).get('status', {})
+        except Exception:
+            status = {}
+        return status
+
+    def _build_session(self):
+        headers, auth, params = self._session_defaults()
+        self._default_params = params
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                         limit_per_host=self.pool_maxsize,
+                                         force_close=not self.keep_alive)
+        return aiohttp.ClientSession(connector=connector,
+                                     headers=headers,
+                                     auth=aiohttp.BasicAuth(*auth) if auth else None,
+                                     timeout=self._client_timeout(),
+                                     trace_configs=[_trace_config()])
+
+    def _client_timeout(self):
+        if self.timeout is None:
+            return aiohttp.ClientTimeout(total=None)
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+            return aiohttp.ClientTimeout(total=None, connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=None, connect=self.timeout, sock_read=self.timeout)
+
+    async def close(self):
+        self._stop_monitor()
+        session = self._detach_session()
+        if session is not None:
+            await session.close()
+
+    async def _ensure_token(self):
+        # Refreshing blocks on the token endpoint, so it runs off the loop.
+        if self.oauth is not None and self.oauth.due():
+            await asyncio.get_running_loop().run_in_executor(None, self.oauth.ensure_fresh)
+
+    def _prepare(self, kwargs):
+        # Per-request settings aiohttp sessions cannot hold themselves.
+        if self._default_params:
+            kwargs['params'] = self._default_params
+        if self.auth == 'OAuth2':
+            kwargs.setdefault('headers', {})['Authorization'] = 'Bearer {0}'.format(self.token['access_token'])
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return kwargs
+
+    async def _send(self, kwargs):
+        # Sends the request, pacing it and retrying it as needed, and
+        # returns the final response along with its body.
+        method = kwargs['method']
+        path = kwargs['url'][len(self.uri):]
+        session = self.session
+        deadline = self._deadline()
+        await self._ensure_token()
+        self._prepare(kwargs)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await asyncio.sleep(self._wait_within(deadline, self.rate_limiter.reserve(), path))
+            breaker = self._admit(path, deadline)
+            event = self._start_event(kwargs, attempt) if self.hooks else None
+            started = time.monotonic()
+            try:
+                async with self._slot(deadline, path):
+                    async with session.request(trace_request_ctx=event, **self._within(kwargs, deadline)) as resp:
+                        body = await resp.read()
+            except BaseException as e:
+                # A call cancelled, or out of time before it was sent, says
+                # nothing about the endpoint.
+                aborted = isinstance(e, HarvestDeadlineError) or not isinstance(e, Exception)
+                if breaker is not None:
+                    if aborted:
+                        breaker.release()
+                    else:
+                        breaker.record(False)
+                if event is not None:
+                    self.hooks.emit('error', event.finish(error=e))
+                if aborted:
+                    raise
+                delay = self._retry_delay(method, attempt)
+                if delay is None:
+                    raise HarvestError(e)
+            else:
+                if breaker is not None:
+                    breaker.record(resp.status not in RETRY_STATUSES, time.monotonic() - started)
+                if event is not None:
+                    self.hooks.emit('after', event.finish(resp.status, len(body)))
+                delay = self._retry_delay(method, attempt, resp.status, resp.headers.get('Retry-After'))
+                if delay is None:
+                    return resp, body
+            attempt += 1
+            await asyncio.sleep(self._wait_within(deadline, delay, path))
+
+    @asynccontextmanager
+    async def _slot(self, deadline, path):
+        # One of the `max_concurrency` places on the wire, waited for no
+        # longer than the deadline allows.
+        if deadline is None:
+            await self._semaphore.acquire()
+        else:
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), deadline.remaining())
+            except asyncio.TimeoutError:
+                raise HarvestDeadlineError('Deadline exceeded waiting to request {0}'.format(path))
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    def _within(self, kwargs, deadline):
+        # Caps the attempt's timeout at the time left before the deadline.
+        # aiohttp reads a total of 0 as no timeout at all, so an expired
+        # deadline raises instead.
+        if deadline is None:
+            return kwargs
+        remaining = deadline.remaining()
+        if not remaining:
+            raise HarvestDeadlineError('Deadline exceeded before requesting {0}'.format(
+                kwargs['url'][len(self.uri):]))
+        timeout = self._client_timeout()
+        return dict(kwargs, timeout=aiohttp.ClientTimeout(total=remaining, connect=timeout.connect,
+                                                          sock_read=timeout.sock_read))
+
+    async def _request(self, method='GET', path='/', data=None, check=False):
+        kwargs = self._request_kwargs(method, path, data)
+        key, entry = self._cache_lookup(method, path, kwargs)
+        if entry is not None and self.cache.fresh(entry):
+            return self.codec.loads(entry.content)
+
+        resp, body = await self._send(kwargs)
+        if check:
+            _check_status(resp.status, method, path)
+
+        if self.cache is not None:
+            entry = self._cache_update(method, path, key, entry, resp.status, resp.headers, body)
+            if entry is not None:
+                return self.codec.loads(entry.content)
+
+        if 'DELETE' not in method:
+            try:
+                return self.codec.loads(body)
+            except ValueError:
+                return resp
+        return resp
+
+    async def _get(self, path='/', data=None, check=False):
+        if self.single_flight is not None and data is None:
+            return self._as_models(await self.single_flight.do(
+                (path, self._cache_account(), check), lambda: self._request('GET', path, check=check),
+                self._deadline()))
+        return self._as_models(await self._request('GET', path, data, check))
+
+    def _fan_out(self, func, keys, max_workers=None):
+        return afan_out(func, keys, max_workers or self.max_concurrency)
+
+    async def _write_batch(self, operations, ledger=None, max_workers=None, dedupe=False):
+        from .batch import WriteBatch
+        batch = WriteBatch(operations, ledger, dedupe)
+        async for index, result, error in self._fan_out(lambda index: self._write(*batch.operations[index]),
+                                                        batch.pending, max_workers):
+            batch.record(index, result, error)
+        return batch.report()
+
+    async def _write(self, method, path, data=None):
+        resp, body = await self._send(self._request_kwargs(method, path, data))
+        if self.cache is not None:
+            self._cache_update(method, path, None, None, resp.status, resp.headers, body)
+        return _write_result(self.codec, method, path, resp.status, body)
+
+    async def _sharded(self, path, windows, max_workers=None):
+        def fetch(window):
+            return self._request('GET', path.format(*window), check=True)
+
+        results = [result async for result in afan_out(fetch, windows, max_workers or self.max_concurrency,
+                                                       retries=SHARD_RETRIES)]
+        return self._as_models(_merge_windows(windows, results))
+
+    async def _stream(self, path):
+        # Streamed responses cannot be replayed once records have been
+        # handed out, so they are paced but not retried.
+        from .streaming import STREAM_CHUNK_SIZE, JSONArrayParser
+        model_for = self._record_model()
+        session = self.session
+        await self._ensure_token()
+        kwargs = self._prepare(self._request_kwargs('GET', path, None))
+        deadline = self._deadline()
+        if self.rate_limiter is not None:
+            await asyncio.sleep(self._wait_within(deadline, self.rate_limiter.reserve(), path))
+        async with self._slot(deadline, path):
+            breaker = self._admit(path, deadline)
+            event = self._start_event(kwargs, 0) if self.hooks else None
+            started = time.monotonic()
+            try:
+                resp = await session.request(trace_request_ctx=event, **self._within(kwargs, deadline))
+            except BaseException as e:
+                # A call cancelled, or out of time before it was sent, says
+                # nothing about the endpoint.
+                aborted = isinstance(e, HarvestDeadlineError) or not isinstance(e, Exception)
+                if breaker is not None:
+                    if aborted:
+                        breaker.release()
+                    else:
+                        breaker.record(False)
+                if event is not None:
+                    self.hooks.emit('error', event.finish(error=e))
+                if aborted:
+                    raise
+                raise HarvestError(e)
+            if breaker is not None:
+                breaker.record(resp.status not in RETRY_STATUSES, time.monotonic() - started)
+            if event is not None:
+                self.hooks.emit('after', event.finish(resp.status, resp.content_length))
+            try:
+                _check_status(resp.status, 'GET', path)
+                parser = JSONArrayParser()
+                async for chunk in resp.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    for record in parser.feed(chunk):
+                        yield model_for(record) if model_for else record
+                for record in _stream_tail(parser):
+                    yield model_for(record) if model_for else record
+            finally:
+                resp.release()
+
+    async def _paginate(self, path, first_page=None, page_size=None, prefetch=True):
+        # Same walk as Harvest._paginate, with the next page fetched as a
+        # task while the current one is consumed.
+        model_for = self._record_model()
+
+        def fetch(page):
+            if page is None:
+                return self._request('GET', path, check=True)
+            return self._request('GET', _with_query(path, [('page', page)]), check=True)
+
+        def submit(page):
+            coro = fetch(page)
+            return asyncio.ensure_future(coro) if prefetch else coro
+
+        page = first_page
+        pending = submit(page)
+        try:
+            while pending is not None:
+                records, next_page = _page_records(await pending, page, page_size)
+                pending = submit(next_page) if next_page else None
+                page = next_page
+                for record in records:
+                    yield model_for(record) if model_for else record
+        finally:
+            if pending is not None:
+                if prefetch:
+                    pending.cancel()
+                else:
+                    pending.close()
+
+
+async def afan_out(func, keys, limit, retries=0):
+    # asyncio counterpart of harvest.fanout.fan_out: awaits func(key) for
+    # every key, at most `limit` at a time, and yields (key, result, error)
+    # as the calls complete.
+    semaphore = asyncio.Semaphore(limit)
+
+    async def call(key):
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    return key, await func(key), None
+            except Exception as e:
+                if attempt >= retries:
+                    return key, None, e
+                attempt += 1
+
+    for completed in asyncio.as_completed([call(key) for key in keys]):
+        yield await completed
+
+
+def _trace_config():
+    # Fills in the timings of the RequestEvent passed as trace_request_ctx.
+    config = aiohttp.TraceConfig()
+
+    def mark(ctx, phase):
+        setattr(ctx, phase, time.monotonic())
+
+    def measure(ctx, phase):
+        event = ctx.trace_request_ctx
+        if event is not None and hasattr(ctx, phase):
+            event.timings[phase] = time.monotonic() - getattr(ctx, phase)
+
+    async def dns_start(session, ctx, params):
+        mark(ctx, 'dns')
+
+    async def dns_end(session, ctx, params):
+        measure(ctx, 'dns')
+
+    async def connect_start(session, ctx, params):
+        mark(ctx, 'connect')
+
+    async def connect_end(session, ctx, params):
+        measure(ctx, 'connect')
+
+    async def headers_received(session, ctx, params):
+        event = ctx.trace_request_ctx
+        if event is not None:
+            event.timings['ttfb'] = time.monotonic() - event.started
+
+    config.on_dns_resolvehost_start.append(dns_start)
+    config.on_dns_resolvehost_end.append(dns_end)
+    config.on_connection_create_start.append(connect_start)
+    config.on_connection_create_end.append(connect_end)
+    config.on_request_end.append(headers_received)
+    return config
@@ -0,0 +1,274 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .harvest import HarvestError, _unwrap
+
+# Vectorized reporting over time entries. An EntryTable holds entries
+# column by column in NumPy arrays: user, project and task ids are interned
+# into small integer codes and dates are stored as day numbers, so grouping
+# and aggregating is a handful of array operations whatever the number of
+# entries:
+#
+#     table = EntryTable.from_entries(client.user_hours(user_id, '20170101', '20171231'))
+#     table.group_by('project', 'month').to_dict()   # {(project_id, '2017-01'): hours, ...}
+#     table.billable_ratio('user')
+#     table.utilization(capacity=40, period='week')
+#
+# Needs numpy: pip install "python-harvest-redux[analytics]"
+
+# Keys entries can be grouped by; the date ones bucket `spent_at`.
+ID_KEYS = ('user', 'project', 'task')
+DATE_KEYS = ('day', 'week', 'month', 'year')
+
+# Above this many possible groups, groups are found by sorting rather than
+# by counting into a dense array.
+DENSE_GROUPS_MAX = 1 << 22
+
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+
+
+def _require_numpy():
+    if np is None:
+        raise HarvestError('harvest.analytics requires numpy: pip install "python-harvest-redux[analytics]"')
+
+
+def _day(value):
+    # A day number from a date, 'YYYY-MM-DD' or 'YYYYMMDD'.
+    value = str(value)
+    if len(value) == 8 and value.isdigit():
+        value = '{0}-{1}-{2}'.format(value[:4], value[4:6], value[6:])
+    return np.datetime64(value, 'D').astype(np.int32)
+
+
+def _reference(record, name):
+    value = record.get(name + '_id')
+    if value is None and isinstance(record.get(name), dict):
+        value = record[name].get('id')
+    return value
+
+
+def _references(records, name):
+    # Ids of a referenced object: v1 `user_id`, or v2 `user: {id: ...}`.
+    ids = [record.get(name + '_id') for record in records]
+    if None in ids:
+        ids = [_reference(record, name) for record in records]
+    return ids
+
+
+def _intern(ids):
+    # Returns the distinct ids and each entry's index into them. Missing
+    # ids become -1.
+    if not isinstance(ids, np.ndarray):
+        ids = np.array([-1 if value is None else value for value in ids], dtype=np.int64)
+    values, codes = np.unique(ids, return_inverse=True)
+    return values, codes.astype(np.int32)
+
+
+class Grouped(object):
+    # The result of EntryTable.group_by: one array per key, holding each
+    # group's key values, and the aggregated `values`.
+    def __init__(self, names, keys, values):
+        self.names = names
+        self.keys = keys
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def to_dict(self):
+        keys = [key.tolist() for key in self.keys]
+        values = self.values.tolist()
+        if len(keys) == 1:
+            return dict(zip(keys[0], values))
+        return dict(zip(zip(*keys), values))
+
+
+class EntryTable(object):
+    def __init__(self, user_ids, project_ids, task_ids, days, hours, billable, ids=None):
+        _require_numpy()
+        self.users, self.user_codes = _intern(user_ids)
+        self.projects, self.project_codes = _intern(project_ids)
+        self.tasks, self.task_codes = _intern(task_ids)
+        self.days = np.asarray(days, dtype='datetime64[D]').astype(np.int32)
+        self.hours = np.asarray(hours, dtype=np.float64)
+        self.billable = np.asarray(billable, dtype=bool)
+        self.ids = None if ids is None else np.asarray(ids, dtype=np.int64)
+
+    @classmethod
+    def from_entries(cls, entries, billable_tasks=None):
+        # Loads v1 (`day_entry`) or v2 (`time_entries`) entries, wrapped or
+        # not, TimeEntry records or RecordColumns. v1 entries do not say
+        # whether they are billable; pass the ids of the billable tasks.
+        if isinstance(entries, dict):
+            entries = entries.get('time_entries', entries.get('day_entries', []))
+        if hasattr(entries, 'to_dicts'):
+            entries = entries.to_dicts()
+        entries = list(entries)
+        if entries and hasattr(entries[0], 'to_dict'):
+            entries = [entry.to_dict() for entry in entries]
+        records = [_unwrap(entry) for entry in entries]
+
+        ids = [record.get('id') for record in records]
+        users = _references(records, 'user')
+        projects = _references(records, 'project')
+        tasks = _references(records, 'task')
+        days = [record.get('spent_date') or record.get('spent_at') for record in records]
+        hours = [record.get('hours') or 0.0 for record in records]
+        if billable_tasks is not None:
+            billable = [task_id in billable_tasks for task_id in tasks]
+        else:
+            billable = [bool(record.get('billable')) for record in records]
+        return cls(users, projects, tasks, days, hours, billable, ids)
+
+    def __len__(self):
+        return len(self.hours)
+
+    def __repr__(self):
+        return '<EntryTable of {0} entries>'.format(len(self))
+
+    def select(self, mask):
+        # A table of the entries where `mask` is true.
+        table = object.__new__(EntryTable)
+        table.users, table.projects, table.tasks = self.users, self.projects, self.tasks
+        for name in ('user_codes', 'project_codes', 'task_codes', 'days', 'hours', 'billable', 'ids'):
+            column = getattr(self, name)
+            setattr(table, name, None if column is None else column[mask])
+        return table
+
+    def between(self, start, end):
+        # Entries spent between two dates, inclusive.
+        return self.select((self.days >= _day(start)) & (self.days <= _day(end)))
+
+    def bucket(self, period):
+        # Each entry's date bucket, as a day number: the day itself, the
+        # Monday of its week, or the first day of its month or year.
+        if period == 'day':
+            return self.days
+        if period == 'week':
+            return self.days - (self.days + _EPOCH_WEEKDAY) % 7
+        if period in ('month', 'year'):
+            if not len(self.days):
+                return self.days
+            # Converting every entry's date is slow; convert each day in the
+            # range once and look entries up in that.
+            unit = 'M' if period == 'month' else 'Y'
+            low = int(self.days.min())
+            span = np.arange(low, int(self.days.max()) + 1, dtype=np.int32)
+            starts = span.astype('datetime64[D]').astype('datetime64[{0}]'.format(unit)).astype(
+                'datetime64[D]').astype(np.int32)
+            return starts[self.days - low]
+        raise HarvestError('Unknown period "{0}"; choose from {1}.'.format(period, ', '.join(DATE_KEYS)))
+
+    def _key(self, name):
+        # Returns (codes, labels) for a key: small non-negative integer codes
+        # per entry and a function turning codes back into key values.
+        if name in ID_KEYS:
+            values = getattr(self, name + 's')
+            return getattr(self, name + '_codes'), lambda codes: values[codes]
+        if name == 'billable':
+            return self.billable.astype(np.int32), lambda codes: codes.astype(bool)
+        if name in DATE_KEYS:
+            buckets = self.bucket(name)
+            low = int(buckets.min()) if len(buckets) else 0
+            unit = {'month': 'M', 'year': 'Y'}.get(name, 'D')
+            codes = buckets - low
+            size = int(codes.max()) + 1 if len(codes) else 1
+            names = (np.arange(size) + low).astype('datetime64[D]').astype('datetime64[{0}]'.format(unit))
+            return codes, lambda codes: names.astype(str)[codes]
+        raise HarvestError('Unknown key "{0}"; choose from {1}.'.format(
+            name, ', '.join(ID_KEYS + DATE_KEYS + ('billable',))))
+
+    def group_by(self, *names, **kwargs):
+        # Aggregates `value` ('hours', or 'count' of entries) per distinct
+        # combination of the keys; `how` is 'sum' or 'mean'. With `where`,
+        # only entries where that mask is true are aggregated.
+        value = kwargs.pop('value', 'hours')
+        how = kwargs.pop('how', 'sum')
+        where = kwargs.pop('where', None)
+        if kwargs:
+            raise TypeError('Unexpected arguments: {0}'.format(', '.join(kwargs)))
+        if not names:
+            raise HarvestError('group_by needs at least one key.')
+
+        keys = [self._key(name) for name in names]
+        sizes = [int(codes.max()) + 1 if len(codes) else 1 for codes, _ in keys]
+        combined = np.zeros(len(self), dtype=np.int64)
+        for (codes, _), size in zip(keys, sizes):
+            combined = combined * size + codes
+
+        weights = None if value == 'count' else getattr(self, value)
+        counts_weights = np.ones(len(self)) if where is None else where.astype(np.float64)
+        if weights is not None and where is not None:
+            weights = weights * where
+
+        total = 1
+        for size in sizes:
+            total *= size
+        if total <= DENSE_GROUPS_MAX or not len(combined):
+            counts = np.bincount(combined, weights=counts_weights, minlength=total)
+            groups = np.nonzero(counts)[0]
+            sums = counts if weights is None else np.bincount(combined, weights=weights, minlength=total)
+            counts, sums = counts[groups], sums[groups]
+        elif len(combined):
+            order = np.argsort(combined)
+            ordered = combined[order]
+            starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+            groups = ordered[starts]
+            counts = np.add.reduceat(counts_weights[order], starts)
+            sums = counts if weights is None else np.add.reduceat(weights[order], starts)
+            present = counts > 0
+            groups, counts, sums = groups[present], counts[present], sums[present]
+
+        if how == 'sum':
+            values = sums
+        elif how == 'mean':
+            values = sums / counts
+        else:
+            raise HarvestError('Unknown aggregate "{0}"; choose from sum, mean.'.format(how))
+
+        labels = []
+        for (_, label), size in reversed(list(zip(keys, sizes))):
+            labels.append(label(groups % size))
+            groups = groups // size
+        return Grouped(names, labels[::-1], values)
+
+    def billable_ratio(self, *names):
+        # Billable hours over all hours, per group (or overall without keys).
+        if not names:
+            total = self.hours.sum()
+            return float(self.hours[self.billable].sum() / total) if total else 0.0
+        everything = self.group_by(*names)
+        billable = self.group_by(*names, where=self.billable)
+        # Groups with no billable hours are missing from the second result.
+        ratios = dict.fromkeys(everything.to_dict(), 0.0)
+        hours = everything.to_dict()
+        for key, value in billable.to_dict().items():
+            ratios[key] = value / hours[key] if hours[key] else 0.0
+        return ratios
+
+    def utilization(self, capacity, period='week', billable_only=True):
+        # Hours per person and period over their capacity for the period;
+        # `capacity` is a number of hours or a {user_id: hours} dict.
+        where = self.billable if billable_only else None
+        grouped = self.group_by('user', period, where=where).to_dict()
+        result = {}
+        for (user_id, bucket), hours in grouped.items():
+            available = capacity.get(user_id) if isinstance(capacity, dict) else capacity
+            result[user_id, bucket] = hours / available if available else None
+        return result
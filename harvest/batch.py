@@ -0,0 +1,145 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+from collections import defaultdict
+
+# Bulk time-entry writes. add_entries, update_entries and delete_entries
+# send their writes concurrently over the client's connection pool, paced
+# by its rate limiter, and return a BatchReport with one WriteResult per
+# item, in input order:
+#
+#     report = client.add_entries(entries, user_id=42)
+#     for result in report.failed:
+#         log.warning('entry %s failed: %s', result.index, result.error)
+#
+# Every write carries an idempotency key: a hash of the request and its
+# position in the batch, or whatever the `key` callable returns for the
+# item. Harvest itself has no notion of these, so they are enforced on our
+# side: an item whose key already succeeded is skipped rather than sent
+# again, within a batch and, given a persistent `ledger` (any mapping, e.g.
+# a shelve), across reruns of an interrupted import. Identical items are
+# distinct writes (two quarter-hour standups on the same day) unless the
+# batch is made with dedupe=True, which keys items on the request alone.
+
+WRITTEN = 'written'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+def idempotency_key(method, path, data, position=None):
+    request = [method, path, data] if position is None else [position, method, path, data]
+    request = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(request.encode('utf-8')).hexdigest()
+
+
+class WriteResult(object):
+    __slots__ = ('index', 'key', 'method', 'path', 'status', 'result', 'error')
+
+    def __init__(self, index, key, method, path, status, result=None, error=None):
+        self.index = index
+        self.key = key
+        self.method = method
+        self.path = path
+        self.status = status
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.status != FAILED
+
+    def __repr__(self):
+        return '<WriteResult {0} {1} {2} {3}>'.format(self.index, self.method, self.path, self.status)
+
+
+class BatchReport(object):
+    def __init__(self, results):
+        self.results = results
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __getitem__(self, index):
+        return self.results[index]
+
+    def __repr__(self):
+        return '<BatchReport written={0} skipped={1} failed={2}>'.format(
+            len(self.written), len(self.skipped), len(self.failed))
+
+    def _with_status(self, status):
+        return [result for result in self.results if result.status == status]
+
+    @property
+    def written(self):
+        return self._with_status(WRITTEN)
+
+    @property
+    def skipped(self):
+        return self._with_status(SKIPPED)
+
+    @property
+    def failed(self):
+        return self._with_status(FAILED)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+class WriteBatch(object):
+    # Bookkeeping for one batch. `operations` are (method, path, data, key)
+    # tuples, key None meaning one derived from the request (and its
+    # position, unless `dedupe`); `pending` lists the indexes that still
+    # need sending.
+    def __init__(self, operations, ledger=None, dedupe=False):
+        self.operations = []
+        self.keys = []
+        self.ledger = {} if ledger is None else ledger
+        self.results = []
+        self.pending = []
+        self._followers = defaultdict(list)
+        leaders = {}
+        for index, (method, path, data, key) in enumerate(operations):
+            if key is None:
+                key = idempotency_key(method, path, data, None if dedupe else index)
+            self.operations.append((method, path, data))
+            self.keys.append(key)
+            self.results.append(None)
+            if key in self.ledger:
+                self.results[index] = WriteResult(index, key, method, path, SKIPPED, self.ledger[key])
+            elif key in leaders:
+                self._followers[leaders[key]].append(index)
+            else:
+                leaders[key] = index
+                self.pending.append(index)
+
+    def record(self, index, result, error):
+        key = self.keys[index]
+        method, path, _ = self.operations[index]
+        if error is None:
+            self.ledger[key] = result
+            self.results[index] = WriteResult(index, key, method, path, WRITTEN, result)
+        else:
+            self.results[index] = WriteResult(index, key, method, path, FAILED, error=error)
+        for follower in self._followers.pop(index, ()):
+            status = SKIPPED if error is None else FAILED
+            self.results[follower] = WriteResult(follower, key, method, path, status, result, error)
+
+    def report(self):
+        return BatchReport(self.results)
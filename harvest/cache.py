@@ -0,0 +1,129 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+
+# GET endpoints that change state and must never be served from cache.
+UNCACHEABLE = ('/toggle', '/daily/timer')
+
+# Writes to time entries also change the entry listings nested under
+# people and projects.
+DEPENDENT_PATHS = {
+    'daily': ('/entries',),
+}
+
+
+class CacheEntry(object):
+    __slots__ = ('content', 'etag', 'last_modified', 'expires')
+
+    def __init__(self, content, etag, last_modified, expires):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    # LRU cache of GET response bodies, keyed by (method, path, account).
+    #
+    # Entries younger than their TTL are served without touching the
+    # network; older ones are revalidated with If-None-Match /
+    # If-Modified-Since and served again on a 304. TTLs default to `ttl`
+    # and can be set per endpoint through `ttls`, a dict of path prefix to
+    # seconds (the longest matching prefix wins):
+    #
+    #     ResponseCache(ttls={'/people': 600, '/tasks': 600, '/projects': 300})
+    #
+    # A single cache may be shared between clients; writes through any of
+    # them drop the entries of the resource they touched.
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=0, ttls=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cacheable(self, path):
+        return not any(marker in path for marker in UNCACHEABLE)
+
+    def ttl_for(self, path):
+        path = path.split('?', 1)[0]
+        matches = [prefix for prefix in self.ttls if path.startswith(prefix)]
+        if not matches:
+            return self.ttl
+        return self.ttls[max(matches, key=len)]
+
+    def fresh(self, entry):
+        return self._clock() < entry.expires
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key, path, content, headers):
+        entry = CacheEntry(content,
+                           headers.get('ETag'),
+                           headers.get('Last-Modified'),
+                           self._clock() + self.ttl_for(path))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def revalidated(self, entry, path):
+        # A 304 confirmed the entry; it is fresh for another TTL.
+        entry.expires = self._clock() + self.ttl_for(path)
+
+    def invalidate(self, account, path):
+        # Drops every entry of the resource collection `path` belongs to,
+        # e.g. a write to /projects/12 drops /projects, /projects/12 and
+        # /projects/12/entries.
+        resource = _resource(path)
+        markers = DEPENDENT_PATHS.get(resource, ())
+        with self._lock:
+            for key in list(self._entries):
+                method, cached, key_account = key
+                if key_account != account:
+                    continue
+                if _resource(cached) == resource or any(marker in cached for marker in markers):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _resource(path):
+    return path.split('?', 1)[0].strip('/').split('/', 1)[0]
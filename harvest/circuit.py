@@ -0,0 +1,242 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Failing fast while Harvest is struggling. A Deadline bounds a request,
+# retries and waits included. A CircuitBreaker watches the outcomes of the
+# requests to one group of endpoints and, once too many fail or are too
+# slow, turns further requests away until a trial request gets through.
+# CircuitBreakers also turn everything away while harveststatus.com says
+# Harvest is down, as checked in the background by a StatusMonitor.
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Share of failed calls among the last `window` that opens a circuit, once
+# at least `min_calls` have been seen.
+FAILURE_RATE = 0.5
+MIN_CALLS = 10
+WINDOW = 20
+
+# Calls slower than this many seconds count as failures.
+SLOW_CALL = 10.0
+
+# Seconds an open circuit waits before letting a trial call through.
+RESET_TIMEOUT = 30.0
+
+# harveststatus.com indicators that mean the API is down.
+DOWN_INDICATORS = ('critical',)
+STATUS_INTERVAL = 60.0
+
+_deadline = ContextVar('harvest_deadline', default=None)
+
+
+class Deadline(object):
+    def __init__(self, seconds, clock=time.monotonic):
+        self.seconds = seconds
+        self._clock = clock
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - self._clock())
+
+    def expired(self):
+        return self._clock() >= self.expires
+
+    def timeout(self, timeout):
+        # A requests timeout that gives up no later than the deadline. The
+        # read timeout bounds each wait for data rather than the whole
+        # response, so a trickling response can still overrun it a little.
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+        return min(timeout, remaining)
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+@contextmanager
+def within(seconds):
+    # Every request made in the block, in this thread or task, shares one
+    # deadline; nested blocks can only shorten it.
+    deadline = Deadline(seconds)
+    outer = _deadline.get()
+    if outer is not None and outer.expires < deadline.expires:
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def endpoint_group(path):
+    # Requests are grouped by the non-numeric parts of their path, so
+    # '/projects/12/entries?from=...' falls under 'projects/entries'.
+    parts = [part for part in path.split('?')[0].split('/') if part and not part.isdigit()]
+    return '/'.join(parts) or '/'
+
+
+class CircuitBreaker(object):
+    def __init__(self, name=None, failure_rate=FAILURE_RATE, min_calls=MIN_CALLS, window=WINDOW,
+                 slow_call=SLOW_CALL, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened = None
+        self._probing = False
+        self._probe_started = None
+
+    def __repr__(self):
+        return '<CircuitBreaker {0} {1}>'.format(self.name, self.state)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._clock() >= self._opened + self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        # None if a call may go ahead, or else the seconds until one might.
+        # A half-open circuit lets a single trial call through at a time; a
+        # trial call that never reports back is given up on after
+        # `reset_timeout`, and another one let through.
+        with self._lock:
+            now = self._clock()
+            if self._state == OPEN:
+                if now < self._opened + self.reset_timeout:
+                    return self._opened + self.reset_timeout - now
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN:
+                if self._probing and now < self._probe_started + self.reset_timeout:
+                    return self._probe_started + self.reset_timeout - now
+                self._probing = True
+                self._probe_started = now
+            return None
+
+    def record(self, success, elapsed=None):
+        failure = not success or (self.slow_call is not None and elapsed is not None and elapsed > self.slow_call)
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+                if failure:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+            elif self._state == CLOSED:
+                self._outcomes.append(failure)
+                calls = len(self._outcomes)
+                if calls >= self.min_calls and sum(self._outcomes) >= self.failure_rate * calls:
+                    self._open()
+
+    def release(self):
+        # Gives back a call's turn without an outcome, for calls that end
+        # for reasons of the caller's own.
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+
+    def _open(self):
+        self._state = OPEN
+        self._opened = self._clock()
+        self._outcomes.clear()
+
+
+class StatusMonitor(object):
+    # Keeps the last status fetched by `fetch` (harvest.status), refreshed
+    # every `interval` seconds on a daemon thread started on first use.
+    # Until the first fetch completes, Harvest is assumed to be up.
+    def __init__(self, fetch, interval=STATUS_INTERVAL, down_indicators=DOWN_INDICATORS):
+        self.fetch = fetch
+        self.interval = interval
+        self.down_indicators = down_indicators
+        self.status = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='harvest-status')
+                    self._thread.daemon = True
+                    self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.refresh()
+            self._stopped.wait(self.interval)
+
+    def refresh(self):
+        # A failed fetch keeps the last status known.
+        status = self.fetch()
+        if status:
+            self.status = status
+        return self.status or {}
+
+    def current(self):
+        self.start()
+        if self.status is None:
+            return self.refresh()
+        return self.status
+
+    def down(self):
+        self.start()
+        return (self.status or {}).get('indicator') in self.down_indicators
+
+
+class CircuitBreakers(object):
+    # One CircuitBreaker per endpoint group, created as groups are first
+    # used with `settings`; share an instance between clients of the same
+    # account to pool what they see.
+    def __init__(self, monitor=None, group=endpoint_group, **settings):
+        self.monitor = monitor
+        self.group = group
+        self.settings = settings
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        name = self.group(path)
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(name, CircuitBreaker(name, **self.settings))
+        return breaker
+
+    def states(self):
+        return dict((name, breaker.state) for name, breaker in list(self.breakers.items()))
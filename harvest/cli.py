@@ -0,0 +1,129 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import os
+import sys
+
+from .harvest import Harvest, HarvestError
+
+# Common queries from the command line, as `harvest` or `python -m harvest`:
+#
+#     $ harvest who_am_i
+#     $ harvest user_hours 12345 20170101 20170131
+#     $ harvest invoices --status open
+#
+# The account comes from HARVEST_URI plus either HARVEST_EMAIL and
+# HARVEST_PASSWORD, or HARVEST_TOKEN and HARVEST_ACCOUNT_ID for a personal
+# access token. Single records are printed as JSON and listings as one JSON
+# record per line, as they arrive.
+
+
+def _client(args):
+    uri = args.uri or os.environ.get('HARVEST_URI')
+    if not uri:
+        raise HarvestError('Set HARVEST_URI or pass --uri.')
+    email = args.email or os.environ.get('HARVEST_EMAIL')
+    account_id = args.account_id or os.environ.get('HARVEST_ACCOUNT_ID')
+    if email:
+        password = os.environ.get('HARVEST_PASSWORD')
+        if not password:
+            raise HarvestError('Set HARVEST_PASSWORD to sign in as {0}.'.format(email))
+        return Harvest(uri, email, password, timeout=args.timeout)
+    if account_id:
+        token = os.environ.get('HARVEST_TOKEN')
+        if not token:
+            raise HarvestError('Set HARVEST_TOKEN to use account {0}.'.format(account_id))
+        return Harvest(uri, personal_token=token, account_id=account_id, timeout=args.timeout)
+    raise HarvestError('Set HARVEST_EMAIL and HARVEST_PASSWORD, or HARVEST_TOKEN and HARVEST_ACCOUNT_ID.')
+
+
+def who_am_i(client, args):
+    return client.who_am_i
+
+
+def today(client, args):
+    if args.user is not None:
+        return client.today_user(args.user)
+    return client.today
+
+
+def user_hours(client, args):
+    return client.stream_user_hours(args.user_id, args.start, args.end)
+
+
+def invoices(client, args):
+    return client.iter_invoices(updated_since=args.updated_since, status=args.status,
+                                from_date=args.from_date, to_date=args.to_date, client=args.client)
+
+
+def parser():
+    parser = argparse.ArgumentParser(prog='harvest', description='Query the Harvest API.')
+    parser.add_argument('--uri', help='Harvest URI (default: $HARVEST_URI)')
+    parser.add_argument('--email', help='account email (default: $HARVEST_EMAIL)')
+    parser.add_argument('--account-id', help='account id for token auth (default: $HARVEST_ACCOUNT_ID)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for Harvest')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    command = commands.add_parser('who_am_i', help='the authenticated user')
+    command.set_defaults(func=who_am_i)
+
+    command = commands.add_parser('today', help="today's entries")
+    command.add_argument('--user', type=int, help='of this user rather than your own')
+    command.set_defaults(func=today)
+
+    command = commands.add_parser('user_hours', help="a user's entries between two dates")
+    command.add_argument('user_id', type=int)
+    command.add_argument('start', help='YYYYMMDD')
+    command.add_argument('end', help='YYYYMMDD')
+    command.set_defaults(func=user_hours)
+
+    command = commands.add_parser('invoices', help='invoices, optionally filtered')
+    command.add_argument('--status', help='open, partial, draft, paid, unpaid or pastdue')
+    command.add_argument('--updated-since', help='YYYY-MM-DD HH:MM')
+    command.add_argument('--from', dest='from_date', help='YYYYMMDD')
+    command.add_argument('--to', dest='to_date', help='YYYYMMDD')
+    command.add_argument('--client', type=int, help='client id')
+    command.set_defaults(func=invoices)
+    return parser
+
+
+def main(argv=None, out=None):
+    args = parser().parse_args(argv)
+    out = out or sys.stdout
+    try:
+        with _client(args) as client:
+            # The status of the last response, which single records do not
+            # carry themselves.
+            statuses = []
+            client.hooks.add('after', lambda event: statuses.append(event.status))
+            result = args.func(client, args)
+            if hasattr(result, 'status_code'):
+                raise HarvestError('Harvest answered {0} with a body that is not JSON.'.format(result.status_code))
+            if isinstance(result, (dict, list)):
+                if statuses and statuses[-1] >= 400:
+                    raise HarvestError('Harvest answered {0}: {1}'.format(statuses[-1], json.dumps(result)))
+                out.write(json.dumps(result, indent=2, sort_keys=True))
+                out.write('\n')
+            else:
+                for record in result:
+                    out.write(json.dumps(record, sort_keys=True))
+                    out.write('\n')
+    except (HarvestError, ValueError) as e:
+        # ValueError: a streamed listing that was cut short or not valid JSON.
+        sys.stderr.write('harvest: {0}\n'.format(e))
+        return 1
+    return 0
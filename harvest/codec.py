@@ -0,0 +1,83 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# How request bodies are encoded and response bodies decoded. A codec has
+# `loads(bytes)` and `dumps(obj)`; pick one by name or pass an instance:
+#
+#     Harvest(uri, email, password, codec='raw')
+#
+# 'json' decodes into plain dicts with the standard library, 'orjson' uses
+# the much faster orjson package, 'ordered' keeps the OrderedDicts older
+# releases returned, and 'raw' hands response bodies back as bytes for
+# callers that forward them untouched. The default is json. orjson is
+# opt-in: it decodes faster but holds more memory while it does, and it
+# refuses bodies json accepts, such as dicts with non-string keys.
+
+
+class JSONCodec(object):
+    name = 'json'
+
+    def loads(self, content):
+        return json.loads(content)
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+
+class OrderedJSONCodec(JSONCodec):
+    name = 'ordered'
+
+    def loads(self, content):
+        return json.loads(content, object_pairs_hook=OrderedDict)
+
+
+class OrjsonCodec(object):
+    name = 'orjson'
+
+    def loads(self, content):
+        return orjson.loads(content)
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+
+class RawCodec(JSONCodec):
+    name = 'raw'
+
+    def loads(self, content):
+        return content
+
+
+CODECS = dict((codec.name, codec) for codec in (JSONCodec, OrderedJSONCodec, OrjsonCodec, RawCodec))
+
+
+def get_codec(codec=None):
+    if codec is None:
+        codec = 'json'
+    if not isinstance(codec, str):
+        return codec
+    if codec == 'orjson' and orjson is None:
+        raise ValueError('The orjson codec requires orjson: pip install "python-harvest-redux[fast]"')
+    try:
+        return CODECS[codec]()
+    except KeyError:
+        raise ValueError('Unknown codec "{0}"; choose from {1}.'.format(codec, ', '.join(sorted(CODECS))))
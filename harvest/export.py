@@ -0,0 +1,249 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import gzip
+import io
+import json
+import os
+
+from .harvest import INVOICES_PER_PAGE, HarvestError, _invoice_filters, _page_records, _unwrap, _with_query
+
+# Exports that run in constant memory. Records are fetched a piece at a
+# time (a date window of entries, streamed off the socket, or a page of
+# invoices), written out as they arrive and flushed at the end of each
+# piece, when a checkpoint is saved next to the output. An interrupted
+# export started again with the same arguments picks up after the last
+# checkpoint:
+#
+#     export_user_hours(client, user_id, '20120101', '20171231', 'hours.csv',
+#                       fields=['id', 'spent_at', 'hours', 'project_id', 'task_id'])
+#     export_invoices(client, 'invoices.jsonl', format='jsonl', status='paid')
+#
+# Formats are 'csv', 'jsonl' and 'columns': gzip-compressed JSON Lines
+# holding one object of column arrays per row group, read back with
+# read_columns(). Fields may be dotted paths into nested objects, such as
+# 'client.name'.
+
+FORMATS = ('csv', 'jsonl', 'columns')
+
+# Rows buffered before a row group is written out.
+DEFAULT_CHUNK_SIZE = 10000
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+
+def _field(record, path):
+    for name in path.split('.'):
+        if not isinstance(record, dict):
+            return None
+        record = record.get(name)
+    return record
+
+
+def _plain(record):
+    if hasattr(record, 'to_dict'):
+        record = record.to_dict()
+    return _unwrap(record)
+
+
+class _TextWriter(object):
+    def __init__(self, f, fields):
+        self.file = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        self.fields = fields
+
+    def flush(self):
+        self.file.flush()
+
+    def detach(self):
+        self.file.flush()
+        self.file.detach()
+
+
+class CSVWriter(_TextWriter):
+    def __init__(self, f, fields, fresh):
+        super(CSVWriter, self).__init__(f, fields)
+        self.writer = csv.writer(self.file)
+        if fresh:
+            self.writer.writerow(fields)
+
+    def write(self, rows):
+        self.writer.writerows([json.dumps(value) if isinstance(value, (dict, list)) else value
+                               for value in row] for row in rows)
+
+
+class JSONLinesWriter(_TextWriter):
+    def __init__(self, f, fields, fresh):
+        super(JSONLinesWriter, self).__init__(f, fields)
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(self.fields, row)) if self.fields else row))
+            self.file.write('\n')
+
+
+class ColumnsWriter(object):
+    # Every row group is a complete gzip member, so the file stays readable
+    # when cut back to any checkpoint.
+    def __init__(self, f, fields, fresh):
+        self.file = f
+        self.fields = fields
+
+    def write(self, rows):
+        if rows:
+            group = {'count': len(rows), 'columns': dict(zip(self.fields, map(list, zip(*rows))))}
+            self.file.write(gzip.compress(json.dumps(group).encode('utf-8') + b'\n'))
+
+    def flush(self):
+        self.file.flush()
+
+    def detach(self):
+        self.flush()
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'jsonl': JSONLinesWriter,
+    'columns': ColumnsWriter,
+}
+
+
+def read_columns(path):
+    # Yields the row groups of a 'columns' export as {field: [values]}.
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)['columns']
+
+
+class Exporter(object):
+    # Writes the records of `pieces`, an iterable of (token, records)
+    # pairs, to `path`. A token identifies a piece that has been written in
+    # full; a source handed the last one saved can skip straight past it.
+    def __init__(self, path, format='csv', fields=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        if format not in WRITERS:
+            raise HarvestError('Unknown format "{0}"; choose from {1}.'.format(format, ', '.join(FORMATS)))
+        self.path = path
+        self.format = format
+        self.fields = list(fields) if fields else None
+        self.chunk_size = chunk_size
+        self.checkpoint_path = path + CHECKPOINT_SUFFIX
+        self.rows = 0
+
+    def checkpoint(self):
+        # The last checkpoint saved, or None. A checkpoint whose output
+        # has gone is discarded, so the export starts over.
+        if not os.path.exists(self.path):
+            self.discard()
+            return None
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _save(self, token, offset):
+        state = {'token': token, 'offset': offset, 'fields': self.fields, 'rows': self.rows,
+                 'format': self.format}
+        temporary = self.checkpoint_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.checkpoint_path)
+
+    def discard(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def resume_token(self):
+        checkpoint = self.checkpoint()
+        return None if checkpoint is None else checkpoint['token']
+
+    def run(self, pieces):
+        checkpoint = self.checkpoint()
+        if checkpoint is not None:
+            if checkpoint['format'] != self.format:
+                raise HarvestError('{0} was started as {1}, not {2}.'.format(
+                    self.path, checkpoint['format'], self.format))
+            self.fields = checkpoint['fields']
+            self.rows = checkpoint['rows']
+            f = open(self.path, 'r+b')
+            f.truncate(checkpoint['offset'])
+            f.seek(checkpoint['offset'])
+        else:
+            f = open(self.path, 'wb')
+
+        writer = None
+        try:
+            for token, records in pieces:
+                buffered = []
+                for record in records:
+                    record = _plain(record)
+                    if writer is None:
+                        if self.fields is None and self.format != 'jsonl':
+                            self.fields = list(record)
+                        writer = WRITERS[self.format](f, self.fields, f.tell() == 0)
+                    buffered.append([_field(record, name) for name in self.fields] if self.fields else record)
+                    self.rows += 1
+                    if len(buffered) >= self.chunk_size:
+                        writer.write(buffered)
+                        buffered = []
+                if writer is not None:
+                    writer.write(buffered)
+                    writer.flush()
+                    f.flush()
+                self._save(token, f.tell())
+            if writer is not None:
+                writer.detach()
+        finally:
+            f.close()
+        self.discard()
+        return self.rows
+
+
+def _windows(start, end, window, after):
+    from .fanout import date_windows
+    for index, (first, last) in enumerate(date_windows(start, end, window)):
+        if after is None or index > after:
+            yield index, first, last
+
+
+def export_user_hours(client, user_id, start, end, path, format='csv', fields=None, window='month',
+                      chunk_size=DEFAULT_CHUNK_SIZE):
+    # Streams a person's entries one date window at a time.
+    exporter = Exporter(path, format, fields, chunk_size)
+    return exporter.run((index, client.stream_user_hours(user_id, first, last))
+                        for index, first, last in _windows(start, end, window, exporter.resume_token()))
+
+
+def export_timesheets(client, project_id, start, end, path, format='csv', fields=None, window='month',
+                      chunk_size=DEFAULT_CHUNK_SIZE):
+    exporter = Exporter(path, format, fields, chunk_size)
+    return exporter.run((index, client.stream_timesheets_for_project(project_id, first, last))
+                        for index, first, last in _windows(start, end, window, exporter.resume_token()))
+
+
+def export_invoices(client, path, format='csv', fields=None, updated_since=None, status=None,
+                    from_date=None, to_date=None, client_id=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Fetches invoices a page at a time. A page Harvest fails to serve
+    # raises, leaving the checkpoint to resume from.
+    exporter = Exporter(path, format, fields, chunk_size)
+    filters = _invoice_filters(updated_since, status, from_date, to_date, client_id)
+
+    def pages(page):
+        while page:
+            response = client._request('GET', _with_query('/invoices', [('page', page)] + filters), check=True)
+            records, next_page = _page_records(response, page, INVOICES_PER_PAGE)
+            yield page, records
+            page = next_page
+
+    return exporter.run(pages((exporter.resume_token() or 0) + 1))
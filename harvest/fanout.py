@@ -0,0 +1,115 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import calendar
+import datetime
+from contextvars import copy_context
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .harvest import HarvestError, _page_records, _unwrap
+
+WINDOW_DAYS = {
+    'day': 1,
+    'week': 7,
+}
+
+
+def fan_out(func, keys, max_workers, retries=0):
+    # Calls func(key) for every key on a pool of `max_workers` threads and
+    # yields (key, result, error) as the calls complete; exactly one of
+    # result and error is set. A failing key is tried again up to
+    # `retries` more times before its error is reported. Each call runs in
+    # a copy of the caller's context, so deadlines set with within() hold.
+    keys = list(keys)
+    attempts = dict.fromkeys(keys, 0)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = dict((executor.submit(copy_context().run, func, key), key) for key in keys)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                error = future.exception()
+                if error is not None and attempts[key] < retries:
+                    attempts[key] += 1
+                    pending[executor.submit(copy_context().run, func, key)] = key
+                elif error is not None:
+                    yield key, None, error
+                else:
+                    yield key, future.result(), None
+
+
+def date_windows(start, end, window):
+    # Splits the inclusive range [start, end] into consecutive windows of a
+    # 'day', a 'week', a calendar 'month' or a number of days. Dates may be
+    # date objects or 'YYYYMMDD' / 'YYYY-MM-DD' strings; the windows come
+    # back in the same style.
+    first, last = _parse_date(start), _parse_date(end)
+    if first > last:
+        raise HarvestError('Start date {0} is after end date {1}.'.format(start, end))
+    fmt = _date_format(start)
+
+    windows = []
+    while first <= last:
+        if window == 'month':
+            days_in_month = calendar.monthrange(first.year, first.month)[1]
+            stop = first.replace(day=days_in_month)
+        else:
+            days = WINDOW_DAYS.get(window, window)
+            if not isinstance(days, int) or days < 1:
+                raise HarvestError('Unknown window "{0}".'.format(window))
+            stop = first + datetime.timedelta(days=days - 1)
+        stop = min(stop, last)
+        windows.append((fmt(first), fmt(stop)))
+        first = stop + datetime.timedelta(days=1)
+    return windows
+
+
+def merge_entries(pages):
+    # Joins per-window responses into one list in date order, dropping
+    # records that showed up in more than one window.
+    seen = set()
+    merged = []
+    for page in pages:
+        for record in _page_records(page, None, None)[0]:
+            data = _unwrap(record)
+            record_id = data.get('id')
+            if record_id is not None:
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+            merged.append(record)
+    merged.sort(key=_spent_on)
+    return merged
+
+
+def _spent_on(record):
+    data = _unwrap(record)
+    return data.get('spent_at') or data.get('spent_date') or ''
+
+
+def _parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.datetime.strptime(str(value).replace('-', ''), '%Y%m%d').date()
+    except ValueError:
+        raise HarvestError('Invalid date "{0}".'.format(value))
+
+
+def _date_format(value):
+    if isinstance(value, datetime.date) or '-' in str(value):
+        return lambda day: day.isoformat()
+    return lambda day: day.strftime('%Y%m%d')
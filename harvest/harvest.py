@@ -12,9 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-import requests
-from requests_oauthlib import OAuth2Session
+import threading
+import time
+from contextvars import copy_context
 
 try:
     from urllib.parse import urlparse
@@ -22,17 +22,61 @@ except ImportError:
     from urlparse import urlparse
 
 from base64 import b64encode as enc64
-from collections import OrderedDict
+
+from .circuit import CircuitBreakers, Deadline, StatusMonitor, current_deadline, within
+from .codec import get_codec
+from .metrics import Hooks, RequestEvent
+from .ratelimit import DEFAULT_RATE_LIMIT, RateLimiter, backoff, parse_retry_after
 
 HARVEST_STATUS_URL = 'http://www.harveststatus.com/api/v2/status.json'
 
+# Seconds to wait for harveststatus.com.
+STATUS_TIMEOUT = 10
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+DEFAULT_MAX_RETRIES = 3
+
+# Responses worth retrying a GET on.
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Extra attempts for a failed date window of a sharded fetch.
+SHARD_RETRIES = 1
+
+# Harvest returns invoices 50 at a time.
+INVOICES_PER_PAGE = 50
+
 class HarvestError(Exception):
     pass
 
 
+class HarvestRateLimitError(HarvestError):
+    def __init__(self, message, retry_after=None):
+        super(HarvestRateLimitError, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class HarvestCircuitOpenError(HarvestError):
+    # Raised instead of sending a request while Harvest is down or its
+    # endpoint's circuit is open; `retry_after` is a hint in seconds.
+    def __init__(self, message, retry_after=None):
+        super(HarvestCircuitOpenError, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class HarvestDeadlineError(HarvestError):
+    pass
+
+
 class Harvest(object):
     def __init__(self, uri, email=None, password=None, refresh_token=None, client_id=None, token=None,
-                 put_auth_in_header=True, personal_token=None, account_id=None):
+                 put_auth_in_header=True, personal_token=None, account_id=None,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False, keep_alive=True, timeout=None,
+                 rate_limit=DEFAULT_RATE_LIMIT, max_retries=DEFAULT_MAX_RETRIES, cache=None,
+                 codec=None, models=False, coalesce=False, client_secret=None, token_url=None,
+                 token_updater=None, adapter=None, deadline=None, circuit_breaker=None):
         self.__uri = uri.rstrip('/')
         parsed = urlparse(uri)
         if not (parsed.scheme and parsed.netloc):
@@ -49,6 +93,7 @@ class Harvest(object):
                 'Accept'        : 'application/json',
                 'User-Agent'    : 'Mozilla/5.0',  # 'TimeTracker for Linux' -- ++ << >>
             }
+        self.oauth = None
         if email and password:
             self.__auth     = 'Basic'
             self.__email    = email.strip()
@@ -56,9 +101,20 @@ class Harvest(object):
             if put_auth_in_header:
                 self.__headers['Authorization'] = 'Basic {0}'.format(enc64("{self.email}:{self.password}".format(self=self).encode("utf8")).decode("utf8"))
         elif client_id and token:
+            # The token is refreshed with `refresh_token` when passed
+            # separately rather than inside it.
+            if refresh_token:
+                token = dict(token, refresh_token=refresh_token)
             self.__auth         = 'OAuth2'
             self.__client_id    = client_id
             self.__token        = token
+            # Refreshed ahead of expiry, see harvest.oauth. `token_updater`
+            # is called with every new token so it can be persisted.
+            from .oauth import OAUTH_TOKEN_PATH, TokenManager
+            self.client_secret = client_secret
+            self.token_url = token_url or self.__uri + OAUTH_TOKEN_PATH
+            self.token_updater = token_updater
+            self.oauth = TokenManager(token, self._refresh_oauth_token, on_refresh=self._token_refreshed)
         elif account_id and personal_token:
             self.__auth = 'Bearer'
             self.__account_id = account_id
@@ -66,6 +122,68 @@ class Harvest(object):
             if put_auth_in_header:
                 self.__headers['Authorization'] = 'Bearer {0}'.format("{self.personal_token}".format(self=self))
                 self.__headers['Harvest-Account-Id'] = "{self.account_id}".format(self=self)
+
+        # Connection pool settings. `pool_connections` is the number of host
+        # pools kept around, `pool_maxsize` the number of connections kept
+        # alive per host. `timeout` is either a single number of seconds or
+        # a (connect, read) tuple, as accepted by requests.
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        # An HTTPAdapter shared with other clients, whose connections this
+        # one borrows instead of keeping its own (see harvest.pool). It is
+        # left open by close().
+        self.adapter = adapter
+        self.__session = None
+        self.__session_lock = threading.Lock()
+
+        # `rate_limit` is a (requests, seconds) budget, a RateLimiter shared
+        # with other clients of the same account, or None to disable pacing.
+        if rate_limit is None or isinstance(rate_limit, RateLimiter):
+            self.rate_limiter = rate_limit
+        else:
+            self.rate_limiter = RateLimiter(*rate_limit)
+        self.max_retries = max_retries
+
+        # Optional ResponseCache for GETs, see harvest.cache.
+        self.cache = cache
+
+        # Encodes request bodies and decodes responses, see harvest.codec.
+        self.codec = get_codec(codec)
+
+        # Return typed records instead of dicts, see harvest.models.
+        self.models = models
+
+        # before/after/error callbacks around every request, see harvest.metrics.
+        self.hooks = Hooks()
+
+        # Share one in-flight GET between concurrent identical calls, see
+        # harvest.singleflight.
+        self.single_flight = None
+        if coalesce:
+            from .singleflight import SingleFlight
+            self.single_flight = SingleFlight()
+
+        # Seconds each request has to complete in, retries included, unless
+        # it is made within() a deadline of its own.
+        self.deadline = deadline
+
+        # CircuitBreakers shared with other clients, or True for this
+        # client's own, watching harveststatus.com. See harvest.circuit.
+        # close() stops the status monitor of the client's own.
+        self._own_monitor = circuit_breaker is True
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreakers(monitor=StatusMonitor(status))
+        self.circuit_breaker = circuit_breaker
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     @property
     def uri(self):
         return self.__uri
@@ -88,6 +206,8 @@ class Harvest(object):
 
     @property
     def token(self):
+        if self.oauth is not None:
+            return self.oauth.token
         return self.__token
 
     @property
@@ -100,8 +220,96 @@ class Harvest(object):
 
     @property
     def status(self):
+        monitor = self.circuit_breaker.monitor if self.circuit_breaker is not None else None
+        if monitor is not None:
+            return monitor.current()
         return status()
 
+    def within(self, seconds):
+        # Context manager giving every request made in the block one
+        # shared deadline.
+        return within(seconds)
+
+    @property
+    def session(self):
+        # Built lazily and shared by every call (and every thread) made
+        # through this instance, so connections are kept alive and reused.
+        if self.__session is None:
+            with self.__session_lock:
+                if self.__session is None:
+                    self.__session = self._build_session()
+        return self.__session
+
+    def _build_session(self):
+        # requests (and the OAuth stack, for OAuth2 clients) is imported on
+        # first use, keeping `import harvest` cheap for short-lived jobs.
+        import requests
+        from requests.adapters import HTTPAdapter
+        if self.auth == 'OAuth2':
+            from requests_oauthlib import OAuth2Session
+            session = OAuth2Session(client_id=self.client_id, token=self.token)
+        else:
+            session = requests.Session()
+
+        adapter = self.adapter or HTTPAdapter(pool_connections=self.pool_connections,
+                                              pool_maxsize=self.pool_maxsize,
+                                              pool_block=self.pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        headers, auth, params = self._session_defaults()
+        session.headers.update(headers)
+        session.auth = auth
+        session.params.update(params)
+        return session
+
+    def _session_defaults(self):
+        # Headers, basic auth credentials and query parameters that go out
+        # with every request, shared by the sync and async transports.
+        headers = dict(self.__headers)
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+
+        auth, params = None, {}
+        if 'Authorization' not in headers:
+            if self.auth == 'Basic':
+                auth = (self.email, self.password)
+            elif self.auth == 'Bearer':
+                params = {
+                    'access_token': self.personal_token,
+                    'account_id': self.account_id,
+                }
+        return headers, auth, params
+
+    def _refresh_oauth_token(self, token):
+        from .oauth import refresh_token_request
+        return refresh_token_request(self.token_url, token, self.client_id, self.client_secret, self.timeout)
+
+    def _token_refreshed(self, token):
+        from requests_oauthlib import OAuth2Session
+        session = self.__session
+        if isinstance(session, OAuth2Session):
+            session.token = token
+        if self.token_updater is not None:
+            self.token_updater(token)
+
+    def _detach_session(self):
+        with self.__session_lock:
+            session, self.__session = self.__session, None
+        return session
+
+    def close(self):
+        self._stop_monitor()
+        session = self._detach_session()
+        if session is not None:
+            if self.adapter is not None:
+                session.adapters.clear()
+            session.close()
+
+    def _stop_monitor(self):
+        if self._own_monitor:
+            self.circuit_breaker.monitor.stop()
+
     ## Accounts
 
     @property
@@ -111,10 +319,10 @@ class Harvest(object):
     ## Client Contacts
 
     def contacts(self, updated_since=None):
-        url = '/contacts'
-        if updated_since is not None:
-            url = '{0}?updated_since={1}'.format(url, updated_since)
-        return self._get(url)
+        return self._get(_with_query('/contacts', [('updated_since', updated_since)]))
+
+    def iter_contacts(self, updated_since=None):
+        return self._paginate(_with_query('/contacts', [('updated_since', updated_since)]))
 
     def get_contact(self, contact_id):
         return self._get('/contacts/{0}'.format(contact_id))
@@ -140,10 +348,10 @@ class Harvest(object):
     ## Clients
 
     def clients(self, updated_since=None):
-        url = '/clients'
-        if updated_since is not None:
-            url = '{0}?updated_since={1}'.format(url, updated_since)
-        return self._get(url)
+        return self._get(_with_query('/clients', [('updated_since', updated_since)]))
+
+    def iter_clients(self, updated_since=None):
+        return self._paginate(_with_query('/clients', [('updated_since', updated_since)]))
 
     def get_client(self, client_id):
         return self._get('/clients/{0}'.format(client_id))
@@ -170,6 +378,9 @@ class Harvest(object):
         url = '/people'
         return self._get(url)
 
+    def iter_people(self):
+        return self._paginate('/people')
+
     def get_person(self, user_id):
         return self._get('/people/{0}'.format(user_id))
 
@@ -190,16 +401,37 @@ class Harvest(object):
             return self._get('/projects?client={0}'.format(client))
         return self._get('/projects')
 
+    def iter_projects(self, client=None):
+        return self._paginate(_with_query('/projects', [('client', client or None)]))
+
     def projects_for_client(self, client_id):
         return self._get('/projects?client={}'.format(client_id))
 
-    def timesheets_for_project(self, project_id, start_date, end_date):
-        return self._get('/projects/{0}/entries?from={1}&to={2}'
-                         .format(project_id, start_date, end_date))
-
-    def expenses_for_project(self, project_id, start_date, end_date):
-        return self._get('/projects/{0}/expenses?from={1}&to={2}'
-                         .format(project_id, start_date, end_date))
+    def timesheets_for_project(self, project_id, start_date, end_date, window=None, max_workers=None):
+        # With a `window` ('day', 'week', 'month' or a number of days) the
+        # range is fetched in slices of that size, concurrently, and merged
+        # back in date order.
+        path = '/projects/{0}/entries?from={{0}}&to={{1}}'.format(project_id)
+        return self._date_range(path, start_date, end_date, window, max_workers)
+
+    def expenses_for_project(self, project_id, start_date, end_date, window=None, max_workers=None):
+        path = '/projects/{0}/expenses?from={{0}}&to={{1}}'.format(project_id)
+        return self._date_range(path, start_date, end_date, window, max_workers)
+
+    def timesheets_for_projects(self, project_ids, start_date, end_date, max_workers=None):
+        # Fetches the timesheets of many projects concurrently, yielding
+        # (project_id, entries, error) as each one completes. An error from
+        # Harvest is reported as the project's error.
+        path = '/projects/{0}/entries?from={{0}}&to={{1}}'
+        return self._fan_out(lambda project_id: self._date_range(path.format(project_id), start_date, end_date,
+                                                                 check=True),
+                             project_ids, max_workers)
+
+    def expenses_for_projects(self, project_ids, start_date, end_date, max_workers=None):
+        path = '/projects/{0}/expenses?from={{0}}&to={{1}}'
+        return self._fan_out(lambda project_id: self._date_range(path.format(project_id), start_date, end_date,
+                                                                 check=True),
+                             project_ids, max_workers)
 
     def get_project(self, project_id):
         return self._get('/projects/{0}'.format(project_id))
@@ -226,6 +458,9 @@ class Harvest(object):
             return self._get('/tasks?updated_since={0}'.format(updated_since))
         return self._get('/tasks')
 
+    def iter_tasks(self, updated_since=None):
+        return self._paginate(_with_query('/tasks', [('updated_since', updated_since or None)]))
+
     def get_task(self, task_id):
         return self._get('/tasks/{0}'.format(task_id))
 
@@ -314,18 +549,14 @@ class Harvest(object):
     ## Invoices
 
     def invoices(self, page=1, updated_since=None, status=None, from_date=None, to_date=None, client=None):
-        url = '/invoices?page={0}'.format(page)
-        if updated_since is not None:
-            url = '{0}&updated_since={1}'.format(url, updated_since)
-        if status is not None:
-            url = '{0}&status={1}'.format(url, status)
-        if from_date is not None:
-            url = '{0}&from={1}'.format(url, from_date)
-        if to_date is not None:
-            url = '{0}&to={1}'.format(url, to_date)
-        if client is not None:
-            url = '{0}&client={1}'.format(url, client)
-        return self._get(url)
+        params = [('page', page)] + _invoice_filters(updated_since, status, from_date, to_date, client)
+        return self._get(_with_query('/invoices', params))
+
+    def iter_invoices(self, updated_since=None, status=None, from_date=None, to_date=None, client=None, page=1):
+        # Walks every page starting at `page`, one invoice at a time.
+        params = _invoice_filters(updated_since, status, from_date, to_date, client)
+        return self._paginate(_with_query('/invoices', params), first_page=page,
+                              page_size=INVOICES_PER_PAGE)
 
     def get_invoice(self, invoice_id):
         return self._get('/invoices/{0}'.format(invoice_id))
@@ -370,8 +601,29 @@ class Harvest(object):
     def update(self, entry_id, data):
         return self._post('/daily/update/{0}'.format(entry_id), data)
 
-    def _get(self, path='/', data=None):
-        return self._request('GET', path, data)
+    # Bulk writes, sent concurrently and reported item by item; see
+    # harvest.batch. `key` maps an item to its idempotency key.
+    def add_entries(self, entries, user_id=None, key=None, ledger=None, max_workers=None, dedupe=False):
+        path = '/daily/add' if user_id is None else '/daily/add?of_user={0}'.format(user_id)
+        return self._write_batch([('POST', path, entry, key(entry) if key else None) for entry in entries],
+                                 ledger, max_workers, dedupe)
+
+    def update_entries(self, updates, key=None, ledger=None, max_workers=None, dedupe=False):
+        # `updates` holds (entry_id, data) pairs.
+        return self._write_batch([('POST', '/daily/update/{0}'.format(entry_id), data,
+                                   key((entry_id, data)) if key else None)
+                                  for entry_id, data in updates], ledger, max_workers, dedupe)
+
+    def delete_entries(self, entry_ids, ledger=None, max_workers=None, dedupe=False):
+        return self._write_batch([('DELETE', '/daily/delete/{0}'.format(entry_id), None, None)
+                                  for entry_id in entry_ids], ledger, max_workers, dedupe)
+
+    def _get(self, path='/', data=None, check=False):
+        if self.single_flight is not None and data is None:
+            return self._as_models(self.single_flight.do(
+                (path, self._cache_account(), check), lambda: self._request('GET', path, check=check),
+                self._deadline()))
+        return self._as_models(self._request('GET', path, data, check))
 
     def _post(self, path='/', data=None):
         return self._request('POST', path, data)
@@ -390,45 +642,423 @@ class Harvest(object):
     def userfilter(self, user_id):
         return self._get('/people/{0}'.format(user_id))
 
-    def user_hours(self, user_id, start, stop):
-        return self._get('/people/{0}/entries?from={1}&to={2}'.format(user_id,start,stop))
-
-    def _request(self, method='GET', path='/', data=None):
-        url = '{self.uri}{path}'.format(self=self, path=path)
+    def user_hours(self, user_id, start, stop, window=None, max_workers=None):
+        path = '/people/{0}/entries?from={{0}}&to={{1}}'.format(user_id)
+        return self._date_range(path, start, stop, window, max_workers)
+
+    def hours_for_users(self, user_ids, start, stop, max_workers=None):
+        # Fetches the entries of many people concurrently, yielding
+        # (user_id, entries, error) as each one completes.
+        path = '/people/{0}/entries?from={{0}}&to={{1}}'
+        return self._fan_out(lambda user_id: self._date_range(path.format(user_id), start, stop, check=True),
+                             user_ids, max_workers)
+
+    def _fan_out(self, func, keys, max_workers=None):
+        from .fanout import fan_out
+        return fan_out(func, keys, max_workers or self.pool_maxsize)
+
+    def _write_batch(self, operations, ledger=None, max_workers=None, dedupe=False):
+        from .batch import WriteBatch
+        batch = WriteBatch(operations, ledger, dedupe)
+        for index, result, error in self._fan_out(lambda index: self._write(*batch.operations[index]),
+                                                  batch.pending, max_workers):
+            batch.record(index, result, error)
+        return batch.report()
+
+    def _write(self, method, path, data=None):
+        # Like _request, but raises HarvestError for writes Harvest rejected.
+        resp = self._send(self._request_kwargs(method, path, data))
+        if self.cache is not None:
+            self._cache_update(method, path, None, None, resp.status_code, resp.headers, resp.content)
+        return _write_result(self.codec, method, path, resp.status_code, resp.content)
+
+    def _date_range(self, path, start, end, window=None, max_workers=None, check=False):
+        # Sharded fetches always check; `check` is for the unsharded one.
+        if window is None:
+            return self._get(path.format(start, end), check=check)
+        from .fanout import date_windows
+        return self._sharded(path, date_windows(start, end, window), max_workers)
+
+    def _sharded(self, path, windows, max_workers=None):
+        # Fetches every (start, end) window of `path` on a worker pool,
+        # trying failed windows once more before giving up. A window
+        # Harvest answered with an error has failed.
+        from .fanout import fan_out
+
+        def fetch(window):
+            return self._request('GET', path.format(*window), check=True)
+
+        results = fan_out(fetch, windows, max_workers or self.pool_maxsize, retries=SHARD_RETRIES)
+        return self._as_models(_merge_windows(windows, results))
+
+    def _record_model(self):
+        # The per-record converter used by the iter_* methods, if any.
+        if not self.models:
+            return None
+        from .models import model_for
+        return model_for
+
+    def _as_models(self, response):
+        if not self.models:
+            return response
+        from .models import to_models
+        return to_models(response)
+
+    def iter_user_hours(self, user_id, start, stop):
+        return self._paginate('/people/{0}/entries?from={1}&to={2}'.format(user_id, start, stop))
+
+    def stream_user_hours(self, user_id, start, stop):
+        # Like iter_user_hours, but entries are parsed straight off the
+        # socket and yielded as they arrive, so memory use stays flat
+        # however long the range.
+        return self._stream('/people/{0}/entries?from={1}&to={2}'.format(user_id, start, stop))
+
+    def stream_timesheets_for_project(self, project_id, start_date, end_date):
+        return self._stream('/projects/{0}/entries?from={1}&to={2}'.format(project_id, start_date, end_date))
+
+    def stream_expenses_for_project(self, project_id, start_date, end_date):
+        return self._stream('/projects/{0}/expenses?from={1}&to={2}'.format(project_id, start_date, end_date))
+
+    def _stream(self, path):
+        from .streaming import STREAM_CHUNK_SIZE, JSONArrayParser
+        model_for = self._record_model()
+        resp = self._send(self._request_kwargs('GET', path, None), stream=True)
+        try:
+            _check_status(resp.status_code, 'GET', path)
+            parser = JSONArrayParser()
+            for chunk in resp.iter_content(STREAM_CHUNK_SIZE):
+                for record in parser.feed(chunk):
+                    yield model_for(record) if model_for else record
+            for record in _stream_tail(parser):
+                yield model_for(record) if model_for else record
+        finally:
+            resp.close()
+
+    def _paginate(self, path, first_page=None, page_size=None, prefetch=True):
+        # Yields records one at a time, following Harvest's pagination.
+        # While the caller works through a page, the next one is already
+        # being fetched on a background thread.
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        model_for = self._record_model()
+
+        def fetch(page):
+            if page is None:
+                return self._request('GET', path, check=True)
+            return self._request('GET', _with_query(path, [('page', page)]), check=True)
+
+        def submit(page):
+            if executor is None:
+                return _Resolved(fetch(page))
+            # In the caller's context, so its deadline carries over.
+            return executor.submit(copy_context().run, fetch, page)
+
+        page = first_page
+        pending = submit(page)
+        try:
+            while pending is not None:
+                records, next_page = _page_records(pending.result(), page, page_size)
+                pending = submit(next_page) if next_page else None
+                page = next_page
+                for record in records:
+                    yield model_for(record) if model_for else record
+        finally:
+            if pending is not None:
+                pending.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _request_kwargs(self, method, path, data):
         kwargs = {
             'method'  : method,
             'url'     : '{self.uri}{path}'.format(self=self, path=path),
-            'headers' : self.__headers,
         }
         if data is not None:
-            kwargs['data'] = json.dumps(data)
-        if self.auth == 'Basic':
-            requestor = requests
-            if 'Authorization' not in self.__headers:
-                kwargs['auth'] = (self.email, self.password)
-        elif self.auth == 'Bearer':
-            requestor = requests
-            if 'Authorization' not in self.__headers:
-                kwargs['access_token'] = self.personal_token
-                kwargs['account_id'] = self.account_id
-        elif self.auth == 'OAuth2':
-            requestor = OAuth2Session(client_id=self.client_id, token=self.token)
-
-        try:
-            resp = requestor.request(**kwargs)
-            if 'DELETE' not in method:
-                try:
-                    return resp.json(object_pairs_hook=OrderedDict)
-                except:
+            kwargs['data'] = self.codec.dumps(data)
+        return kwargs
+
+    def _retry_delay(self, method, attempt, status=None, retry_after=None):
+        # Seconds to wait before trying again, or None if the outcome stands.
+        # Throttled requests were never processed, so any method may be
+        # retried; other failures are only retried for GETs.
+        if status == 429:
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = backoff(attempt)
+            if attempt >= self.max_retries:
+                raise HarvestRateLimitError('Harvest is throttling requests', retry_after=delay)
+            if self.rate_limiter is not None:
+                # Holds back every caller sharing the budget, this one included.
+                self.rate_limiter.pause(delay)
+                return 0
+            return delay
+        if method != 'GET' or attempt >= self.max_retries:
+            return None
+        if status is None or status in RETRY_STATUSES:
+            return backoff(attempt)
+        return None
+
+    def _cache_account(self):
+        # Whose data a cached response is.
+        if self.auth == 'Bearer':
+            return self.uri, self.account_id
+        if self.auth == 'OAuth2':
+            return self.uri, self.client_id
+        return self.uri, self.email
+
+    def _cache_lookup(self, method, path, kwargs):
+        # Returns the cache key and cached entry for a cacheable GET, and
+        # makes the request conditional when the entry has gone stale.
+        if self.cache is None or method != 'GET' or not self.cache.cacheable(path):
+            return None, None
+        key = (method, path, self._cache_account())
+        entry = self.cache.get(key)
+        if entry is not None and not self.cache.fresh(entry):
+            kwargs['headers'] = entry.validators()
+        return key, entry
+
+    def _cache_update(self, method, path, key, entry, status, headers, content):
+        # Records the response in the cache and returns the entry to answer
+        # from when Harvest says ours is still current.
+        if key is None:
+            if status < 400:
+                self.cache.invalidate(self._cache_account(), path)
+            return None
+        if status == 304 and entry is not None:
+            self.cache.revalidated(entry, path)
+            return entry
+        if status == 200 and 'json' in headers.get('Content-Type', ''):
+            self.cache.store(key, path, content, headers)
+        return None
+
+    def _start_event(self, kwargs, attempt):
+        event = RequestEvent(kwargs['method'], kwargs['url'][len(self.uri):],
+                             len(kwargs.get('data') or ''), attempt)
+        self.hooks.emit('before', event)
+        return event
+
+    def _deadline(self):
+        # The deadline set with within(), or a fresh one of `deadline`
+        # seconds for this request.
+        deadline = current_deadline()
+        if deadline is None and self.deadline is not None:
+            deadline = Deadline(self.deadline)
+        return deadline
+
+    def _wait_within(self, deadline, delay, path):
+        # Returns `delay`, unless waiting that long would miss the deadline.
+        if deadline is not None and delay >= deadline.remaining():
+            raise HarvestDeadlineError('Deadline exceeded waiting to request {0}'.format(path))
+        return delay
+
+    def _admit(self, path, deadline):
+        # Raises instead of letting an attempt go out that cannot succeed,
+        # and returns the circuit breaker to report its outcome to.
+        if deadline is not None and deadline.expired():
+            raise HarvestDeadlineError('Deadline exceeded before requesting {0}'.format(path))
+        breakers = self.circuit_breaker
+        if breakers is None:
+            return None
+        if breakers.monitor is not None and breakers.monitor.down():
+            raise HarvestCircuitOpenError('Harvest is down: {0}'.format(
+                breakers.monitor.status.get('description')), retry_after=breakers.monitor.interval)
+        breaker = breakers.get(path)
+        retry_after = breaker.allow()
+        if retry_after is not None:
+            raise HarvestCircuitOpenError('Circuit open for {0} requests'.format(breaker.name),
+                                          retry_after=retry_after)
+        return breaker
+
+    def _send(self, kwargs, stream=False):
+        # Sends the request, pacing it and retrying it as needed, and
+        # returns the final response.
+        method = kwargs['method']
+        path = kwargs['url'][len(self.uri):]
+        deadline = self._deadline()
+        attempt = 0
+        while True:
+            if self.oauth is not None:
+                self.oauth.ensure_fresh()
+            if self.rate_limiter is not None:
+                delay = self.rate_limiter.reserve()
+                if delay:
+                    time.sleep(self._wait_within(deadline, delay, path))
+            breaker = self._admit(path, deadline)
+            event = self._start_event(kwargs, attempt) if self.hooks else None
+            started = time.monotonic()
+            try:
+                resp = self._transmit(kwargs, stream, deadline)
+            except BaseException as e:
+                # A call cancelled, or out of time before it was sent, says
+                # nothing about the endpoint.
+                aborted = isinstance(e, HarvestDeadlineError) or not isinstance(e, Exception)
+                if breaker is not None:
+                    if aborted:
+                        breaker.release()
+                    else:
+                        breaker.record(False)
+                if event is not None:
+                    self.hooks.emit('error', event.finish(error=e))
+                if aborted:
+                    raise
+                delay = self._retry_delay(method, attempt)
+                if delay is None:
+                    raise HarvestError(e)
+            else:
+                if breaker is not None:
+                    breaker.record(resp.status_code not in RETRY_STATUSES, time.monotonic() - started)
+                if event is not None:
+                    event.timings['ttfb'] = resp.elapsed.total_seconds()
+                    size = resp.headers.get('Content-Length') if stream else len(resp.content)
+                    self.hooks.emit('after', event.finish(resp.status_code, int(size) if size else None))
+                delay = self._retry_delay(method, attempt, resp.status_code, resp.headers.get('Retry-After'))
+                if delay is None:
                     return resp
-            return resp
-        except Exception as e:
-            raise HarvestError(e)
-
+                resp.close()
+            attempt += 1
+            time.sleep(self._wait_within(deadline, delay, path))
+
+    def _transmit(self, kwargs, stream=False, deadline=None):
+        # One attempt at the request, once it has been paced. Its timeout
+        # is worked out last, so any wait before it counts against the
+        # deadline.
+        timeout = self.timeout
+        if deadline is not None:
+            if deadline.expired():
+                raise HarvestDeadlineError('Deadline exceeded before requesting {0}'.format(
+                    kwargs['url'][len(self.uri):]))
+            timeout = deadline.timeout(timeout)
+        return self.session.request(timeout=timeout, stream=stream, **kwargs)
+
+    def _request(self, method='GET', path='/', data=None, check=False):
+        # With `check`, an error from Harvest raises HarvestError rather
+        # than being returned like any other body.
+        kwargs = self._request_kwargs(method, path, data)
+        key, entry = self._cache_lookup(method, path, kwargs)
+        if entry is not None and self.cache.fresh(entry):
+            return self.codec.loads(entry.content)
+
+        resp = self._send(kwargs)
+        if check:
+            _check_status(resp.status_code, method, path)
+
+        if self.cache is not None:
+            entry = self._cache_update(method, path, key, entry, resp.status_code, resp.headers, resp.content)
+            if entry is not None:
+                return self.codec.loads(entry.content)
+
+        if 'DELETE' not in method:
+            try:
+                return self.codec.loads(resp.content)
+            except ValueError:
+                return resp
+        return resp
+
+
+class _Resolved(object):
+    # Stands in for a Future when prefetching is turned off.
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+    def cancel(self):
+        return False
+
+
+def _with_query(path, params):
+    # Appends the (key, value) pairs whose value is not None to the path.
+    for key, value in params:
+        if value is not None:
+            path = '{0}{1}{2}={3}'.format(path, '&' if '?' in path else '?', key, value)
+    return path
+
+
+def _write_result(codec, method, path, status, content):
+    if status >= 400:
+        raise HarvestError('{0} {1} failed with {2}: {3!r}'.format(method, path, status, content[:200]))
+    try:
+        return codec.loads(content) if content else None
+    except ValueError:
+        return None
+
+
+def _invoice_filters(updated_since, status, from_date, to_date, client):
+    return [
+        ('updated_since', updated_since),
+        ('status', status),
+        ('from', from_date),
+        ('to', to_date),
+        ('client', client),
+    ]
+
+
+def _check_status(status, method, path):
+    if status >= 400:
+        raise HarvestError('Harvest answered {0} to {1} {2}'.format(status, method, path))
+
+
+def _stream_tail(parser):
+    # The records left once the body has been read. A response that turned
+    # out not to be a bare array was buffered whole; its records come from
+    # the page it holds.
+    records = parser.close()
+    if parser.is_array is False:
+        return _page_records(records[0], None, None)[0]
+    return records
+
+
+def _merge_windows(windows, results):
+    # Combines the (window, page, error) results of a sharded fetch.
+    from .fanout import merge_entries
+    pages, failed = {}, {}
+    for window, page, error in results:
+        if error is None:
+            pages[window] = page
+        else:
+            failed[window] = error
+    if failed:
+        # Windows cut short by the deadline fail the call as a whole.
+        error = HarvestError
+        if any(isinstance(e, HarvestDeadlineError) for e in failed.values()):
+            error = HarvestDeadlineError
+        raise error('Failed to fetch {0} of {1} date windows: {2}'.format(
+            len(failed), len(windows), '; '.join('{0} to {1}: {2}'.format(start, end, error)
+                                                 for (start, end), error in sorted(failed.items()))))
+    return merge_entries(pages[window] for window in windows)
+
+
+def _unwrap(record):
+    # v1 wraps each record in its type, e.g. {"client": {...}}.
+    if isinstance(record, dict) and len(record) == 1:
+        value = next(iter(record.values()))
+        if isinstance(value, dict):
+            return value
+    return record
+
+
+def _page_records(response, page, page_size):
+    # Returns the records in a page and the number of the page after it,
+    # or None on the last page. v2 endpoints wrap records in an object
+    # carrying an explicit `next_page`; v1 endpoints answer with a bare
+    # list, and the ones taking a `page` argument end on the first page
+    # shorter than `page_size`.
+    if isinstance(response, dict):
+        records = next((value for value in response.values() if isinstance(value, list)), None)
+        if records is None:
+            raise HarvestError('Unexpected response from Harvest: {0!r}'.format(response))
+        return records, response.get('next_page')
+    if not isinstance(response, list):
+        raise HarvestError('Unexpected response from Harvest: {0!r}'.format(response))
+    if page is not None and response and (page_size is None or len(response) >= page_size):
+        return response, page + 1
+    return response, None
 
 def status():
+    import requests
     try:
-        status = requests.get(HARVEST_STATUS_URL).json().get('status', {})
-    except:
+        status = requests.get(HARVEST_STATUS_URL, timeout=STATUS_TIMEOUT).json().get('status', {})
+    except Exception:
         status = {}
     return status
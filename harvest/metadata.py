@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-__version__ = "4.0.0"
+__version__ = "5.0.0"
 __author__ = "Alex Goretoy"
 __copyright__ = "Copyright 2012-2018, Lionheart Software LLC"
 __maintainer__ = "Dan Loewenherz"
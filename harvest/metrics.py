@@ -0,0 +1,207 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+# Request instrumentation. Every HTTP attempt a client makes is described by
+# a RequestEvent handed to the callbacks registered on `client.hooks`:
+#
+#     client.hooks.add('before', lambda event: ...)
+#     client.hooks.add('after', lambda event: log.info('%s %s %s %.3f', event.method,
+#                                                      event.endpoint, event.status, event.elapsed))
+#     client.hooks.add('error', lambda event: ...)
+#
+# MetricsCollector is a ready-made set of callbacks keeping per-endpoint
+# counters and latency histograms, with a Prometheus text exporter:
+#
+#     metrics = MetricsCollector()
+#     metrics.attach(client)
+#     metrics.render()
+
+HOOK_EVENTS = ('before', 'after', 'error')
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint(path):
+    # The path template a request belongs to, e.g. /projects/{id}/entries.
+    return _ID_SEGMENT.sub('/{id}', path.split('?', 1)[0])
+
+
+class RequestEvent(object):
+    # One HTTP attempt. `timings` holds whichever phases the transport can
+    # measure, in seconds: 'dns' and 'connect' (connection set-up, TLS
+    # included) with aiohttp, 'ttfb' (until the response headers) and
+    # 'download' (reading the body) with both.
+    def __init__(self, method, path, request_bytes=0, attempt=0):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint(path)
+        self.request_bytes = request_bytes
+        self.attempt = attempt
+        self.status = None
+        self.response_bytes = None
+        self.error = None
+        self.timings = {}
+        self.started = time.monotonic()
+        self.elapsed = None
+
+    @property
+    def retries(self):
+        return self.attempt
+
+    def finish(self, status=None, response_bytes=None, error=None):
+        self.elapsed = time.monotonic() - self.started
+        self.status = status
+        self.response_bytes = response_bytes
+        self.error = error
+        if 'ttfb' in self.timings and status is not None:
+            self.timings.setdefault('download', max(0.0, self.elapsed - self.timings['ttfb']))
+        return self
+
+
+class Hooks(object):
+    def __init__(self):
+        self.before = []
+        self.after = []
+        self.error = []
+
+    def __bool__(self):
+        return bool(self.before or self.after or self.error)
+
+    __nonzero__ = __bool__
+
+    def add(self, event, callback):
+        if event not in HOOK_EVENTS:
+            raise ValueError('Unknown hook "{0}"; choose from {1}.'.format(event, ', '.join(HOOK_EVENTS)))
+        getattr(self, event).append(callback)
+
+    def remove(self, event, callback):
+        getattr(self, event).remove(callback)
+
+    def emit(self, event, request_event):
+        for callback in getattr(self, event):
+            callback(request_event)
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsCollector(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.request_bytes = defaultdict(int)
+        self.response_bytes = defaultdict(int)
+        self.latency = defaultdict(lambda: Histogram(self.buckets))
+
+    def attach(self, client):
+        for event in HOOK_EVENTS:
+            client.hooks.add(event, getattr(self, event))
+        return self
+
+    def detach(self, client):
+        for event in HOOK_EVENTS:
+            client.hooks.remove(event, getattr(self, event))
+
+    def before(self, event):
+        with self._lock:
+            self.in_flight += 1
+            if event.attempt:
+                self.retries[event.method, event.endpoint] += 1
+
+    def after(self, event):
+        key = event.method, event.endpoint
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[key + (str(event.status),)] += 1
+            self.request_bytes[key] += event.request_bytes
+            self.response_bytes[key] += event.response_bytes or 0
+            self.latency[key].observe(event.elapsed)
+
+    def error(self, event):
+        key = event.method, event.endpoint
+        with self._lock:
+            self.in_flight -= 1
+            self.errors[key + (type(event.error).__name__,)] += 1
+            self.request_bytes[key] += event.request_bytes
+            self.latency[key].observe(event.elapsed)
+
+    def render(self):
+        # The collected metrics in the Prometheus text exposition format.
+        with self._lock:
+            lines = []
+            _counter(lines, 'harvest_requests_total', 'HTTP responses received.',
+                     self.requests, ('method', 'endpoint', 'status'))
+            _counter(lines, 'harvest_request_errors_total', 'Requests that failed without a response.',
+                     self.errors, ('method', 'endpoint', 'error'))
+            _counter(lines, 'harvest_request_retries_total', 'Requests that were retries of an earlier attempt.',
+                     self.retries, ('method', 'endpoint'))
+            _counter(lines, 'harvest_request_bytes_total', 'Request body bytes sent.',
+                     self.request_bytes, ('method', 'endpoint'))
+            _counter(lines, 'harvest_response_bytes_total', 'Response body bytes received.',
+                     self.response_bytes, ('method', 'endpoint'))
+
+            lines.append('# HELP harvest_requests_in_flight Requests currently waiting on Harvest.')
+            lines.append('# TYPE harvest_requests_in_flight gauge')
+            lines.append('harvest_requests_in_flight {0}'.format(self.in_flight))
+
+            lines.append('# HELP harvest_request_duration_seconds Time spent on each request.')
+            lines.append('# TYPE harvest_request_duration_seconds histogram')
+            for key, histogram in sorted(self.latency.items()):
+                labels = _labels(('method', 'endpoint'), key)
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('harvest_request_duration_seconds_bucket{{{0},le="{1}"}} {2}'.format(
+                        labels, le, cumulative))
+                lines.append('harvest_request_duration_seconds_sum{{{0}}} {1!r}'.format(labels, histogram.sum))
+                lines.append('harvest_request_duration_seconds_count{{{0}}} {1}'.format(labels, histogram.count))
+            return '\n'.join(lines) + '\n'
+
+
+def _counter(lines, name, help_text, values, label_names):
+    lines.append('# HELP {0} {1}'.format(name, help_text))
+    lines.append('# TYPE {0} counter'.format(name))
+    for key, value in sorted(values.items()):
+        lines.append('{0}{{{1}}} {2}'.format(name, _labels(label_names, key), value))
+
+
+def _labels(names, values):
+    return ','.join('{0}="{1}"'.format(name, _escape(value)) for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
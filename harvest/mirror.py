@@ -0,0 +1,153 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import sqlite3
+from collections import OrderedDict
+
+from .harvest import HarvestError, _unwrap
+
+DEFAULT_BATCH_SIZE = 500
+
+# Resources that can be fetched incrementally, and the client method that
+# walks each of them with an `updated_since` filter.
+RESOURCES = OrderedDict([
+    ('clients', 'iter_clients'),
+    ('contacts', 'iter_contacts'),
+    ('tasks', 'iter_tasks'),
+    ('invoices', 'iter_invoices'),
+])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    resource    TEXT NOT NULL,
+    id          INTEGER NOT NULL,
+    updated_at  TEXT,
+    data        TEXT NOT NULL,
+    PRIMARY KEY (resource, id)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    resource    TEXT PRIMARY KEY,
+    updated_at  TEXT NOT NULL
+);
+"""
+
+UPSERT = ('INSERT OR REPLACE INTO records (resource, id, updated_at, data) '
+          'VALUES (?, ?, ?, ?)')
+
+
+class HarvestMirror(object):
+    # Local SQLite copy of the resources Harvest can filter by
+    # `updated_since`. Each sync only asks for records changed since the
+    # newest `updated_at` seen for that resource, and writes them in
+    # batches; the watermark moves in the same transaction as the last
+    # batch, so an interrupted sync is simply picked up again next run.
+    #
+    #     mirror = HarvestMirror(client, 'harvest.sqlite3')
+    #     mirror.sync()
+    #     active = list(mirror.find('clients', active=True))
+    #
+    # Harvest does not report deletions through `updated_since`; call
+    # reset() and sync again to drop records removed upstream.
+    def __init__(self, client, path=':memory:', batch_size=DEFAULT_BATCH_SIZE):
+        self.client = client
+        self.batch_size = batch_size
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def sync(self, resources=None):
+        # Returns the number of records written per resource.
+        return OrderedDict((resource, self.sync_resource(resource)) for resource in resources or RESOURCES)
+
+    def sync_resource(self, resource):
+        fetch = getattr(self.client, _method(resource))
+        watermark = self.watermark(resource)
+        written = 0
+        batch = []
+        for record in fetch(updated_since=watermark):
+            data = _unwrap(record.to_dict() if hasattr(record, 'to_dict') else record)
+            updated_at = data.get('updated_at')
+            if updated_at and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+            batch.append((resource, data['id'], updated_at, json.dumps(data)))
+            if len(batch) >= self.batch_size:
+                written += self._write(batch)
+                batch = []
+        written += self._write(batch, resource, watermark)
+        return written
+
+    def _write(self, batch, resource=None, watermark=None):
+        with self.db:
+            self.db.executemany(UPSERT, batch)
+            if resource is not None and watermark is not None:
+                self.db.execute('INSERT OR REPLACE INTO watermarks (resource, updated_at) VALUES (?, ?)',
+                                (resource, watermark))
+        return len(batch)
+
+    def watermark(self, resource):
+        row = self.db.execute('SELECT updated_at FROM watermarks WHERE resource = ?', (resource,)).fetchone()
+        return row[0] if row else None
+
+    def reset(self, resource=None):
+        with self.db:
+            if resource is None:
+                self.db.execute('DELETE FROM records')
+                self.db.execute('DELETE FROM watermarks')
+            else:
+                self.db.execute('DELETE FROM records WHERE resource = ?', (resource,))
+                self.db.execute('DELETE FROM watermarks WHERE resource = ?', (resource,))
+
+    ## Queries
+
+    def get(self, resource, record_id):
+        row = self.db.execute('SELECT data FROM records WHERE resource = ? AND id = ?',
+                              (resource, record_id)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def all(self, resource):
+        return self.find(resource)
+
+    def find(self, resource, **fields):
+        # Records whose top-level fields equal the given values, e.g.
+        # find('invoices', client_id=23445, state='open').
+        sql = 'SELECT data FROM records WHERE resource = ?'
+        params = [resource]
+        for field, value in sorted(fields.items()):
+            sql += ' AND json_extract(data, ?) = ?'
+            params.extend(['$.{0}'.format(field), value])
+        for row in self.db.execute(sql + ' ORDER BY id', params):
+            yield _loads(row[0])
+
+    def count(self, resource):
+        return self.db.execute('SELECT COUNT(*) FROM records WHERE resource = ?', (resource,)).fetchone()[0]
+
+
+def _method(resource):
+    try:
+        return RESOURCES[resource]
+    except KeyError:
+        raise HarvestError('Cannot mirror "{0}"; choose from {1}.'.format(resource, ', '.join(RESOURCES)))
+
+
+def _loads(data):
+    return json.loads(data)
@@ -0,0 +1,271 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+from array import array
+from collections.abc import Sequence
+
+from .harvest import _unwrap
+
+# Typed, compact alternatives to the dicts Harvest responses decode into,
+# returned by clients created with models=True:
+#
+#     client = Harvest(uri, email, password, models=True)
+#     entries = client.user_hours(user_id, '20170101', '20171231')
+#     sum(entries.column('hours'))
+#
+# Records keep their known fields in __slots__; anything else Harvest sends
+# ends up in `extra` and is still reachable as an attribute. Nested objects
+# (v2 `user`, `project`, ... references) stay as they came until first
+# accessed. Lists of records are held column by column in RecordColumns,
+# with ids and amounts packed into arrays.
+
+# Short strings that repeat across records (dates, states, currencies) are
+# interned so every record shares one copy.
+INTERN_MAX_LENGTH = 32
+
+
+def _lazy(name, model):
+    slot = '_' + name
+
+    def get(self):
+        value = getattr(self, slot)
+        if isinstance(value, dict):
+            value = model.from_dict(value)
+            setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+
+    return property(get, set)
+
+
+def _slots(fields, nested=()):
+    return tuple(fields) + tuple('_' + name for name in nested)
+
+
+class Model(object):
+    __slots__ = ('extra',)
+
+    fields = ()
+    # Nested objects, by field name, decoded into the given model on access.
+    nested = {}
+    # array.array typecodes for columns RecordColumns can pack.
+    columns = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super(Model, cls).__init_subclass__(**kwargs)
+        for name, model in cls.nested.items():
+            setattr(cls, name, _lazy(name, model))
+
+    def __init__(self, **values):
+        for name in self.fields:
+            setattr(self, name, values.pop(name, None))
+        for name in self.nested:
+            setattr(self, '_' + name, values.pop(name, None))
+        self.extra = values or None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**_unwrap(data))
+
+    def __getattr__(self, name):
+        # Only called for names that are not slots.
+        if name != 'extra' and self.extra and name in self.extra:
+            return self.extra[name]
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(type(self).__name__, name))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<{0} id={1!r}>'.format(type(self).__name__, getattr(self, 'id', None))
+
+    def to_dict(self):
+        data = dict((name, getattr(self, name)) for name in self.fields)
+        for name in self.nested:
+            value = getattr(self, '_' + name)
+            data[name] = value.to_dict() if isinstance(value, Model) else value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+class Reference(Model):
+    fields = ('id', 'name')
+    __slots__ = _slots(fields)
+
+
+class TimeEntry(Model):
+    fields = ('id', 'spent_at', 'spent_date', 'hours', 'notes', 'user_id', 'project_id', 'task_id',
+              'is_billed', 'is_closed', 'is_running', 'timer_started_at', 'started_time', 'ended_time',
+              'adjustment_record', 'created_at', 'updated_at')
+    nested = {'user': Reference, 'client': Reference, 'project': Reference, 'task': Reference}
+    columns = {'id': 'q', 'hours': 'd', 'user_id': 'q', 'project_id': 'q', 'task_id': 'q'}
+    __slots__ = _slots(fields, nested)
+
+
+class Project(Model):
+    fields = ('id', 'client_id', 'name', 'code', 'active', 'is_active', 'billable', 'is_billable', 'bill_by',
+              'budget', 'budget_by', 'hourly_rate', 'notes', 'starts_on', 'ends_on', 'created_at', 'updated_at')
+    nested = {'client': Reference}
+    columns = {'id': 'q', 'client_id': 'q', 'budget': 'd', 'hourly_rate': 'd'}
+    __slots__ = _slots(fields, nested)
+
+
+class Client(Model):
+    fields = ('id', 'name', 'active', 'is_active', 'currency', 'details', 'address', 'highrise_id',
+              'created_at', 'updated_at')
+    columns = {'id': 'q'}
+    __slots__ = _slots(fields)
+
+
+class Invoice(Model):
+    fields = ('id', 'client_id', 'number', 'amount', 'due_amount', 'tax', 'tax_amount', 'discount',
+              'state', 'subject', 'notes', 'currency', 'issued_at', 'issue_date', 'due_at', 'due_date',
+              'period_start', 'period_end', 'purchase_order', 'created_at', 'updated_at')
+    nested = {'client': Reference, 'creator': Reference}
+    columns = {'id': 'q', 'client_id': 'q', 'amount': 'd', 'due_amount': 'd'}
+    __slots__ = _slots(fields, nested)
+
+
+class Person(Model):
+    fields = ('id', 'email', 'first_name', 'last_name', 'is_active', 'is_admin', 'is_contractor',
+              'telephone', 'timezone', 'default_hourly_rate', 'cost_rate', 'created_at', 'updated_at')
+    columns = {'id': 'q', 'default_hourly_rate': 'd', 'cost_rate': 'd'}
+    __slots__ = _slots(fields)
+
+
+class Task(Model):
+    fields = ('id', 'name', 'billable_by_default', 'billable', 'default_hourly_rate', 'is_default',
+              'deactivated', 'is_active', 'created_at', 'updated_at')
+    columns = {'id': 'q', 'default_hourly_rate': 'd'}
+    __slots__ = _slots(fields)
+
+
+# Which model a record is, by the key Harvest wraps it (v1) or lists it
+# under (v2).
+MODELS = {
+    'day_entry': TimeEntry,
+    'day_entries': TimeEntry,
+    'time_entry': TimeEntry,
+    'time_entries': TimeEntry,
+    'project': Project,
+    'projects': Project,
+    'client': Client,
+    'clients': Client,
+    'invoice': Invoice,
+    'invoices': Invoice,
+    'user': Person,
+    'users': Person,
+    'task': Task,
+    'tasks': Task,
+}
+
+
+class RecordColumns(Sequence):
+    # A list of records of one model stored column by column. Indexing and
+    # iterating build model instances on demand; column() gives direct
+    # access to a field's values.
+    def __init__(self, model, records):
+        self.model = model
+        names = model.fields + tuple(model.nested)
+        known = set(names)
+        columns = dict((name, []) for name in names)
+        extra = []
+        count = 0
+        for record in records:
+            for name in names:
+                columns[name].append(_compact(record.get(name)))
+            extra.append(dict((key, value) for key, value in record.items() if key not in known) or None)
+            count += 1
+
+        for name, typecode in model.columns.items():
+            try:
+                columns[name] = array(typecode, columns[name])
+            except TypeError:
+                # Missing or mixed values; keep the plain list.
+                pass
+        self._columns = columns
+        self._extra = extra if any(extra) else None
+        self._length = count
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('record index out of range')
+        values = dict((name, column[index]) for name, column in self._columns.items())
+        if self._extra is not None and self._extra[index]:
+            values.update(self._extra[index])
+        return self.model(**values)
+
+    def __repr__(self):
+        return '<RecordColumns of {0} {1}>'.format(self._length, self.model.__name__)
+
+    def column(self, name):
+        return self._columns[name]
+
+    def to_dicts(self):
+        return [record.to_dict() for record in self]
+
+
+def _compact(value):
+    if type(value) is str and len(value) <= INTERN_MAX_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+def _wrapper_key(record):
+    if isinstance(record, dict) and len(record) == 1:
+        key, value = next(iter(record.items()))
+        if isinstance(value, dict):
+            return key
+    return None
+
+
+def model_for(record):
+    # Converts one wrapped record, leaving anything unrecognised alone.
+    key = _wrapper_key(record)
+    if key in MODELS:
+        return MODELS[key](**record[key])
+    return record
+
+
+def to_models(response):
+    # Converts a decoded response: wrapped records become model instances
+    # and lists of records become RecordColumns.
+    if isinstance(response, list):
+        key = _wrapper_key(response[0]) if response else None
+        if key in MODELS and all(_wrapper_key(record) == key for record in response):
+            return RecordColumns(MODELS[key], [record[key] for record in response])
+        return response
+    if isinstance(response, dict):
+        if _wrapper_key(response) in MODELS:
+            return model_for(response)
+        converted = dict(response)
+        for key, value in response.items():
+            if key in MODELS and isinstance(value, list):
+                converted[key] = RecordColumns(MODELS[key], value)
+        return converted
+    return response
@@ -0,0 +1,149 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import requests
+
+from .harvest import HarvestError
+
+# OAuth2 token upkeep. A client created with an OAuth2 token holds it in a
+# TokenManager, which every thread making requests through the client
+# shares. Once the token is within `margin` seconds of expiring it is
+# refreshed on a background thread while requests carry on with the old
+# one; a request finding it already expired waits for the refresh instead.
+# Either way, a burst of requests triggers a single refresh:
+#
+#     client = Harvest(uri, client_id=client_id, client_secret=secret, token=token,
+#                      token_updater=save_token)
+
+# Where Harvest hands out tokens, relative to the account uri.
+OAUTH_TOKEN_PATH = '/oauth2/token'
+
+# Seconds before expiry at which a token is refreshed.
+REFRESH_MARGIN = 300
+
+
+def _expires_at(token, now):
+    if token.get('expires_at') is not None:
+        return float(token['expires_at'])
+    if token.get('expires_in') is not None:
+        return now + float(token['expires_in'])
+    return None
+
+
+class TokenManager(object):
+    # `refresh` is called with the current token and returns its
+    # replacement; `on_refresh` is called with every new token, e.g. to
+    # persist it.
+    def __init__(self, token, refresh, margin=REFRESH_MARGIN, on_refresh=None, clock=time.time):
+        self.clock = clock
+        self.margin = margin
+        self.on_refresh = on_refresh
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+        self._token = self._stamp(token)
+        self.refreshes = 0
+        self.error = None
+
+    def _stamp(self, token):
+        token = dict(token)
+        expires_at = _expires_at(token, self.clock())
+        if expires_at is not None:
+            token['expires_at'] = expires_at
+        return token
+
+    @property
+    def token(self):
+        return self._token
+
+    @property
+    def expires_at(self):
+        return self._token.get('expires_at')
+
+    def expired(self):
+        return self.expires_at is not None and self.clock() >= self.expires_at
+
+    def due(self):
+        return self.expires_at is not None and self.clock() >= self.expires_at - self.margin
+
+    def ensure_fresh(self):
+        # Returns the token to send a request with, refreshing it first if
+        # it has expired and in the background if it is about to.
+        token = self._token
+        if not token.get('refresh_token') or not self.due():
+            return token
+        if self.expired():
+            return self.refresh(token)
+        self._refresh_in_background(token)
+        return token
+
+    def refresh(self, stale=None):
+        # Replaces the token. Callers passing the token they found stale
+        # return right away if someone else already replaced it.
+        with self._lock:
+            if stale is not None and self._token is not stale:
+                return self._token
+            token = self._stamp(self._refresh(self._token))
+            token.setdefault('refresh_token', self._token.get('refresh_token'))
+            self._token = token
+            self.refreshes += 1
+            self.error = None
+        if self.on_refresh is not None:
+            self.on_refresh(token)
+        return token
+
+    def _refresh_in_background(self, stale):
+        with self._state_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        thread = threading.Thread(target=self._background_refresh, args=(stale,), name='harvest-token-refresh')
+        thread.daemon = True
+        thread.start()
+
+    def _background_refresh(self, stale):
+        try:
+            self.refresh(stale)
+        except Exception as e:
+            # The current token is still good; the next request will try
+            # again.
+            self.error = e
+        finally:
+            with self._state_lock:
+                self._refreshing = False
+
+
+def refresh_token_request(token_url, token, client_id, client_secret=None, timeout=None):
+    # Exchanges a token's refresh_token for a new token.
+    data = {
+        'grant_type': 'refresh_token',
+        'refresh_token': token['refresh_token'],
+        'client_id': client_id,
+    }
+    if client_secret is not None:
+        data['client_secret'] = client_secret
+    try:
+        resp = requests.post(token_url, data=data, headers={'Accept': 'application/json'}, timeout=timeout)
+    except requests.RequestException as e:
+        raise HarvestError(e)
+    if resp.status_code != 200:
+        raise HarvestError('Token refresh failed with {0}: {1}'.format(resp.status_code, resp.text[:200]))
+    try:
+        return resp.json()
+    except ValueError:
+        raise HarvestError('Token refresh returned an unexpected response: {0!r}'.format(resp.text[:200]))
@@ -0,0 +1,195 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+
+from .harvest import DEFAULT_POOL_CONNECTIONS, Harvest, HarvestDeadlineError, HarvestError
+from .ratelimit import DEFAULT_RATE_LIMIT
+
+# Many Harvest accounts served from one process. A HarvestPool hands out a
+# client per account (Bearer auth with a personal token) and all of them
+# send their requests over one shared set of keep-alive connections:
+#
+#     pool = HarvestPool('https://api.harvestapp.com/v2', max_connections=20)
+#     for account_id, token in accounts:
+#         pool.client(account_id, token)
+#     for account_id, projects, error in pool.each(lambda client: client.projects()):
+#         ...
+#
+# Every account keeps its own rate budget, so throughput grows with the
+# number of accounts. Connections are handed to waiting accounts in turn,
+# so an account with thousands of queued requests holds at most its share
+# of them while others are waiting.
+
+# Connections to Harvest kept open, and requests in flight, across all
+# accounts.
+DEFAULT_MAX_CONNECTIONS = 20
+
+
+class FairScheduler(object):
+    # Admits up to `slots` requests at a time. While requests are waiting
+    # for a slot, freed slots go to the waiting accounts round-robin, each
+    # account's requests in the order they arrived.
+    def __init__(self, slots):
+        self.slots = slots
+        self.active = 0
+        self.granted = Counter()
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()
+
+    def acquire(self, account, timeout=None):
+        # Returns whether a slot was granted within `timeout` seconds; a
+        # request that gives up leaves the line.
+        with self._lock:
+            if self.active < self.slots and not self._queues:
+                self.active += 1
+                self.granted[account] += 1
+                return True
+            turn = threading.Event()
+            self._queues.setdefault(account, deque()).append(turn)
+        if turn.wait(timeout):
+            return True
+        with self._lock:
+            if turn.is_set():
+                return True
+            queue = self._queues[account]
+            queue.remove(turn)
+            if not queue:
+                del self._queues[account]
+        return False
+
+    def release(self):
+        with self._lock:
+            if not self._queues:
+                self.active -= 1
+                return
+            # The slot passes straight to the account at the head of the
+            # line, which then goes to the back of it.
+            account, queue = self._queues.popitem(last=False)
+            turn = queue.popleft()
+            if queue:
+                self._queues[account] = queue
+            self.granted[account] += 1
+            turn.set()
+
+    @contextmanager
+    def slot(self, account):
+        self.acquire(account)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @property
+    def waiting(self):
+        # Requests waiting for a slot, by account.
+        with self._lock:
+            return dict((account, len(queue)) for account, queue in self._queues.items())
+
+
+class PooledHarvest(Harvest):
+    # A client of one account in a HarvestPool. Requests wait for a slot
+    # from the pool's scheduler after being paced by the account's own
+    # rate limiter, so an account waiting out its budget holds no slot.
+    # The time spent waiting for the slot counts against the deadline.
+    def __init__(self, uri, pool, **kwargs):
+        self.pool = pool
+        super(PooledHarvest, self).__init__(uri, adapter=pool.adapter, **kwargs)
+
+    def _transmit(self, kwargs, stream=False, deadline=None):
+        scheduler = self.pool.scheduler
+        if not scheduler.acquire(self.account_id, None if deadline is None else deadline.remaining()):
+            raise HarvestDeadlineError('Deadline exceeded waiting for a connection to request {0}'.format(
+                kwargs['url'][len(self.uri):]))
+        try:
+            return super(PooledHarvest, self)._transmit(kwargs, stream, deadline)
+        finally:
+            scheduler.release()
+
+
+class HarvestPool(object):
+    # `rate_limit` is the (requests, seconds) budget of each account; other
+    # keyword arguments (timeout, max_retries, cache, codec, models, ...)
+    # are passed to every client.
+    def __init__(self, uri, max_connections=DEFAULT_MAX_CONNECTIONS, rate_limit=DEFAULT_RATE_LIMIT, **kwargs):
+        self.uri = uri
+        self.max_connections = max_connections
+        self.rate_limit = rate_limit
+        self.kwargs = kwargs
+        self.adapter = HTTPAdapter(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=max_connections)
+        self.scheduler = FairScheduler(max_connections)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __contains__(self, account_id):
+        return account_id in self._clients
+
+    def __getitem__(self, account_id):
+        return self.client(account_id)
+
+    @property
+    def accounts(self):
+        return list(self._clients)
+
+    def client(self, account_id, personal_token=None):
+        # The account's client, created on first use; pass the personal
+        # token the first time, or again to replace it.
+        with self._lock:
+            client = self._clients.get(account_id)
+            if client is not None and personal_token in (None, client.personal_token):
+                return client
+            if personal_token is None:
+                raise HarvestError('No client for account {0}; pass its personal token.'.format(account_id))
+            self._clients[account_id] = PooledHarvest(self.uri, self, account_id=account_id,
+                                                      personal_token=personal_token,
+                                                      rate_limit=self.rate_limit, **self.kwargs)
+        if client is not None:
+            client.close()
+        return self._clients[account_id]
+
+    def remove(self, account_id):
+        with self._lock:
+            client = self._clients.pop(account_id, None)
+        if client is not None:
+            client.close()
+
+    def each(self, func, accounts=None, max_workers=None):
+        # Calls func(client) for every account (or those given) at once and
+        # yields (account_id, result, error) as the calls complete.
+        from .fanout import fan_out
+        accounts = self.accounts if accounts is None else list(accounts)
+        if not accounts:
+            return iter(())
+        return fan_out(lambda account_id: func(self.client(account_id)), accounts,
+                       max_workers or len(accounts))
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), OrderedDict()
+        for client in clients:
+            client.close()
+        self.adapter.close()
@@ -0,0 +1,110 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import random
+import threading
+import time
+
+# Harvest allows 100 requests every 15 seconds per account.
+DEFAULT_RATE_LIMIT = (100, 15)
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+class RateLimiter(object):
+    # Token bucket holding up to `requests` tokens, refilled at
+    # `requests / period` tokens per second. Callers reserve a token and
+    # sleep for the returned delay, so requests are paced ahead of time
+    # instead of being rejected by Harvest. Share one instance between
+    # clients talking to the same account.
+    #
+    # Reservations may drive the bucket negative; the deficit is the number
+    # of callers still waiting for their turn.
+    def __init__(self, requests=DEFAULT_RATE_LIMIT[0], period=DEFAULT_RATE_LIMIT[1], clock=time.monotonic):
+        self.capacity = float(requests)
+        self.rate = float(requests) / period
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self):
+        # Takes a token and returns how many seconds to wait before using it.
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= 1
+            ready = self._updated + max(0.0, -self._tokens) / self.rate
+            return max(0.0, ready - now)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        # Stops handing out tokens for `seconds`, e.g. after a 429. Waiting
+        # callers are pushed back behind the pause.
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            until = now + seconds
+            if until > self._updated:
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = until
+
+    @property
+    def budget(self):
+        # Requests that can go out right now without waiting.
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if self._updated > now:
+                return 0
+            return int(max(0.0, self._tokens))
+
+    @property
+    def queue_depth(self):
+        # Callers holding a reservation they are still waiting on.
+        with self._lock:
+            self._refill(self._clock())
+            return int(math.ceil(max(0.0, -self._tokens)))
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # Exponential backoff with full jitter.
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date.
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
@@ -0,0 +1,146 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from functools import partialmethod
+
+from .harvest import HarvestError, _unwrap
+
+# Delta-only updates. A Reconciler takes the same arguments as the client's
+# update_* methods, compares them with the last known state of the record
+# and sends only the fields that differ, or nothing at all:
+#
+#     reconciler = Reconciler(client)
+#     reconciler.remember('client', client.clients())
+#     for record in desired_clients:
+#         reconciler.update_client(record['id'], client=record)
+#     reconciler.report.written, reconciler.report.skipped
+#
+# Known state comes from remember() (a listing, or HarvestMirror.all()),
+# from earlier writes, or else from a GET of the record, which a client
+# with a ResponseCache can answer without Harvest. Reconcilers work with
+# Harvest, not AsyncHarvest.
+
+# Path of each resource, by the key Harvest wraps its records in.
+RESOURCES = {
+    'client': '/clients/{0}',
+    'contact': '/contacts/{0}',
+    'project': '/projects/{0}',
+    'task': '/tasks/{0}',
+    'invoice': '/invoices/{0}',
+    'expense_category': '/expense_categories/{0}',
+}
+
+
+def diff(current, desired):
+    # The parts of `desired` that differ from `current`, or None. Nested
+    # objects are compared field by field.
+    changes = {}
+    for name, value in desired.items():
+        known = current.get(name) if isinstance(current, dict) else None
+        if isinstance(value, dict) and isinstance(known, dict):
+            nested = diff(known, value)
+            if nested is not None:
+                changes[name] = nested
+        elif name not in current or known != value or isinstance(known, bool) != isinstance(value, bool):
+            # True == 1, but Harvest would not agree.
+            changes[name] = value
+    return changes or None
+
+
+def _merge(current, changes):
+    merged = dict(current)
+    for name, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(name), dict):
+            merged[name] = _merge(merged[name], value)
+        else:
+            merged[name] = value
+    return merged
+
+
+class Change(object):
+    __slots__ = ('resource', 'record_id', 'fields', 'result', 'error')
+
+    def __init__(self, resource, record_id, fields=None, result=None, error=None):
+        self.resource = resource
+        self.record_id = record_id
+        self.fields = fields
+        self.result = result
+        self.error = error
+
+    def __repr__(self):
+        return '<Change {0} {1} {2}>'.format(self.resource, self.record_id, sorted(self.fields or ()))
+
+
+class ReconcileReport(object):
+    def __init__(self):
+        self.written = []
+        self.skipped = []
+        self.failed = []
+
+    def __repr__(self):
+        return '<ReconcileReport written={0} skipped={1} failed={2}>'.format(
+            len(self.written), len(self.skipped), len(self.failed))
+
+
+class Reconciler(object):
+    def __init__(self, client):
+        self.client = client
+        self.state = {}
+        self.report = ReconcileReport()
+
+    def remember(self, resource, records):
+        # Records the current state of records, wrapped or not.
+        for record in records:
+            record = _unwrap(record.to_dict() if hasattr(record, 'to_dict') else record)
+            self.state[resource, record['id']] = record
+
+    def known(self, resource, record_id):
+        key = (resource, record_id)
+        if key not in self.state:
+            record = self.client._request('GET', RESOURCES[resource].format(record_id))
+            if not isinstance(record, dict):
+                raise HarvestError('Could not fetch {0} {1}: {2!r}'.format(resource, record_id, record))
+            self.state[key] = _unwrap(record)
+        return self.state[key]
+
+    def update(self, resource, record_id, **kwargs):
+        # Sends the fields of kwargs (wrapped in the resource name as the
+        # update_* methods expect, or flat) that differ from the known
+        # state. Returns Harvest's response, or None if nothing changed.
+        if resource not in RESOURCES:
+            raise HarvestError('Unknown resource "{0}"; choose from {1}.'.format(
+                resource, ', '.join(sorted(RESOURCES))))
+        wrapped = list(kwargs) == [resource] and isinstance(kwargs[resource], dict)
+        desired = kwargs[resource] if wrapped else kwargs
+        changes = diff(self.known(resource, record_id), desired)
+        if changes is None:
+            self.report.skipped.append(Change(resource, record_id))
+            return None
+
+        try:
+            result = self.client._write('PUT', RESOURCES[resource].format(record_id),
+                                        {resource: changes} if wrapped else changes)
+        except HarvestError as e:
+            self.report.failed.append(Change(resource, record_id, changes, error=e))
+            raise
+        self.state[resource, record_id] = _merge(self.state[resource, record_id], changes)
+        self.report.written.append(Change(resource, record_id, changes, result))
+        return result
+
+    update_client = partialmethod(update, 'client')
+    update_contact = partialmethod(update, 'contact')
+    update_project = partialmethod(update, 'project')
+    update_task = partialmethod(update, 'task')
+    update_invoice = partialmethod(update, 'invoice')
+    update_expense_category = partialmethod(update, 'expense_category')
@@ -0,0 +1,273 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import mmap
+import os
+import struct
+from collections import OrderedDict
+
+from .harvest import HarvestError, _unwrap, _with_query
+
+# An on-disk snapshot of the records reports look names up in. The file is
+# memory-mapped, so opening it costs the same whatever its size, and every
+# resource has a hash table keyed on id, so a lookup is a hash and a probe
+# or two:
+#
+#     store = ReferenceStore('harvest-refs.bin')
+#     store.refresh(client)                      # once in a while
+#     store.name('projects', entry['project_id'])
+#
+# refresh() writes a new snapshot beside the old one and renames it into
+# place, so any number of processes can read the file while one refreshes
+# it; readers see the new snapshot after reload().
+
+MAGIC = b'HVREFS01'
+
+# Resource, its listing and whether the listing takes `updated_since`.
+# Resources without it are fetched whole on every refresh.
+RESOURCES = OrderedDict([
+    ('people', ('/people', False)),
+    ('projects', ('/projects', False)),
+    ('tasks', ('/tasks', True)),
+    ('clients', ('/clients', True)),
+    ('expense_categories', ('/expense_categories', False)),
+])
+
+# A table slot: id, offset of the name in the file, name length, length of
+# the record following the name. Empty slots have id 0.
+_SLOT = struct.Struct('<qQII')
+_HEADER = struct.Struct('<8sI')
+_FIBONACCI = 11400714819323198485
+_MASK64 = (1 << 64) - 1
+
+
+def record_name(record):
+    # What a record is called: people by their full name, everything else
+    # by its name.
+    if record.get('name') is not None:
+        return record['name']
+    return ' '.join(part for part in (record.get('first_name'), record.get('last_name')) if part)
+
+
+def _slot(record_id, bits):
+    return ((record_id * _FIBONACCI) & _MASK64) >> (64 - bits)
+
+
+def _bits(count):
+    bits = 3
+    while (1 << bits) < count * 2:
+        bits += 1
+    return bits
+
+
+class ReferenceStore(object):
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._map = None
+        self._stat = None
+        self.meta = {'resources': {}}
+        self.reload()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._map = self._file = self._stat = None
+        self.meta = {'resources': {}}
+
+    def reload(self):
+        # Maps the current snapshot, if it changed since it was last
+        # mapped. Returns whether it did.
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if self._stat is not None and (stat.st_ino, stat.st_mtime_ns) == self._stat:
+            return False
+        self.close()
+        f = open(self.path, 'rb')
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            f.close()
+            raise HarvestError('{0} is empty.'.format(self.path))
+        magic, length = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            data.close()
+            f.close()
+            raise HarvestError('{0} is not a reference store.'.format(self.path))
+        self.meta = json.loads(data[_HEADER.size:_HEADER.size + length].decode('utf-8'))
+        self._file, self._map, self._stat = f, data, (stat.st_ino, stat.st_mtime_ns)
+        return True
+
+    ## Lookups
+
+    def _find(self, resource, record_id):
+        # The (name offset, name length, record length) of a record.
+        table = self.meta['resources'].get(resource)
+        if table is None or self._map is None:
+            return None
+        bits, offset = table['bits'], table['offset']
+        mask = (1 << bits) - 1
+        index = _slot(record_id, bits)
+        while True:
+            slot_id, position, name_length, record_length = _SLOT.unpack_from(
+                self._map, offset + index * _SLOT.size)
+            if slot_id == record_id:
+                return position, name_length, record_length
+            if slot_id == 0:
+                return None
+            index = (index + 1) & mask
+
+    def name(self, resource, record_id, default=None):
+        found = self._find(resource, record_id) if record_id else None
+        if found is None:
+            return default
+        position, name_length, _ = found
+        return self._map[position:position + name_length].decode('utf-8')
+
+    def names(self, resource, record_ids, default=None):
+        return [self.name(resource, record_id, default) for record_id in record_ids]
+
+    def get(self, resource, record_id):
+        found = self._find(resource, record_id) if record_id else None
+        if found is None:
+            return None
+        position, name_length, record_length = found
+        start = position + name_length
+        return json.loads(self._map[start:start + record_length].decode('utf-8'))
+
+    def __contains__(self, key):
+        resource, record_id = key
+        return self._find(resource, record_id) is not None
+
+    def count(self, resource):
+        return self.meta['resources'].get(resource, {}).get('count', 0)
+
+    def records(self, resource):
+        # Every record of a resource, in no particular order.
+        table = self.meta['resources'].get(resource)
+        if table is None:
+            return
+        for index in range(1 << table['bits']):
+            slot_id, position, name_length, record_length = _SLOT.unpack_from(
+                self._map, table['offset'] + index * _SLOT.size)
+            if slot_id:
+                start = position + name_length
+                yield json.loads(self._map[start:start + record_length].decode('utf-8'))
+
+    def watermark(self, resource):
+        return self.meta['resources'].get(resource, {}).get('watermark')
+
+    ## Refreshing
+
+    def refresh(self, client, resources=None):
+        # Fetches what changed since the last refresh and writes a new
+        # snapshot. Returns the number of records fetched per resource. If
+        # any listing fails, HarvestError is raised and the snapshot is
+        # left as it was.
+        fetched = OrderedDict()
+        tables = OrderedDict()
+        for resource in resources or RESOURCES:
+            path, incremental = _resource(resource)
+            watermark = self.watermark(resource) if incremental else None
+            records = client._paginate(_with_query(path, [('updated_since', watermark)]))
+            if watermark is not None:
+                table = dict((record['id'], record) for record in self.records(resource))
+            else:
+                table = {}
+            count = 0
+            try:
+                for record in records:
+                    record = _unwrap(record.to_dict() if hasattr(record, 'to_dict') else record)
+                    table[record['id']] = record
+                    updated_at = record.get('updated_at')
+                    if incremental and updated_at and (watermark is None or updated_at > watermark):
+                        watermark = updated_at
+                    count += 1
+            except HarvestError as e:
+                raise HarvestError('Could not refresh {0}, so the snapshot was kept: {1}'.format(resource, e))
+            fetched[resource] = count
+            tables[resource] = (table, watermark)
+
+        for resource in self.meta['resources']:
+            if resource not in tables:
+                tables[resource] = (dict((record['id'], record) for record in self.records(resource)),
+                                    self.watermark(resource))
+        self._write(tables)
+        self.reload()
+        return fetched
+
+    def _write(self, tables):
+        # Lays out the header, then every resource's hash table, then the
+        # names and records the slots point at.
+        meta = {'resources': {}}
+        layouts = []
+        for resource, (table, watermark) in tables.items():
+            bits = _bits(len(table))
+            meta['resources'][resource] = {'bits': bits, 'count': len(table), 'watermark': watermark,
+                                           'offset': 0}
+            layouts.append((resource, table, bits))
+
+        # Offsets depend on the header's length, which depends on the
+        # offsets; a fixed-width placeholder breaks the cycle.
+        for entry in meta['resources'].values():
+            entry['offset'] = 10 ** 15
+        header_length = _HEADER.size + len(json.dumps(meta).encode('utf-8'))
+        position = header_length
+        for resource, _, bits in layouts:
+            meta['resources'][resource]['offset'] = position
+            position += (1 << bits) * _SLOT.size
+        encoded = json.dumps(meta).encode('utf-8').ljust(header_length - _HEADER.size)
+
+        temporary = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(temporary, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, len(encoded)))
+            f.write(encoded)
+            heap = []
+            for resource, table, bits in layouts:
+                slots = bytearray((1 << bits) * _SLOT.size)
+                taken = bytearray(1 << bits)
+                mask = (1 << bits) - 1
+                for record_id, record in table.items():
+                    name = record_name(record).encode('utf-8')
+                    data = json.dumps(record, separators=(',', ':')).encode('utf-8')
+                    index = _slot(record_id, bits)
+                    while taken[index]:
+                        index = (index + 1) & mask
+                    taken[index] = 1
+                    _SLOT.pack_into(slots, index * _SLOT.size, record_id, position, len(name), len(data))
+                    heap.append(name)
+                    heap.append(data)
+                    position += len(name) + len(data)
+                f.write(slots)
+            f.write(b''.join(heap))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+
+def _resource(resource):
+    try:
+        return RESOURCES[resource]
+    except KeyError:
+        raise HarvestError('Unknown resource "{0}"; choose from {1}.'.format(resource, ', '.join(RESOURCES)))
@@ -0,0 +1,108 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import threading
+
+from .harvest import HarvestDeadlineError
+
+# Request coalescing. While a call for a key is in flight, later calls for
+# the same key wait for it and get its result (or exception) instead of
+# making their own. Clients created with coalesce=True route their GETs
+# through one of these, keyed on path and account:
+#
+#     client = Harvest(uri, email, password, coalesce=True)
+#
+# Every caller of a coalesced request receives the same decoded object, so
+# results must be treated as read-only. A caller given a Deadline waits no
+# longer than it allows; the shared call carries on for the others.
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    # For threads sharing one client.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, func, deadline=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(None if deadline is None else deadline.remaining()):
+                raise _expired()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class AsyncSingleFlight(object):
+    # For tasks on one event loop; `func` returns an awaitable. The shared
+    # call runs as its own task, so a caller being cancelled does not cancel
+    # it for the others.
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, func, deadline=None):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        if deadline is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), deadline.remaining())
+        except asyncio.TimeoutError:
+            if task.done():
+                raise
+            raise _expired()
+
+    def __len__(self):
+        return len(self._calls)
+
+
+def _expired():
+    return HarvestDeadlineError('Deadline exceeded waiting for a coalesced request')
@@ -0,0 +1,102 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import codecs
+import json
+
+# Bytes read from the socket at a time when streaming a response.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = ',]' + _WHITESPACE
+
+
+class JSONArrayParser(object):
+    # Parses a JSON document whose top level is an array from a sequence of
+    # byte chunks, handing back each element as soon as it is complete, so
+    # only the element being read is ever buffered:
+    #
+    #     parser = JSONArrayParser()
+    #     for chunk in chunks:
+    #         for item in parser.feed(chunk):
+    #             ...
+    #     remaining = parser.close()
+    #
+    # A document that is not an array is buffered whole and returned by
+    # close() as its only item, with `is_array` set to False.
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._state = 'start'
+        self.is_array = None
+
+    def feed(self, chunk):
+        self._buffer += self._text.decode(chunk)
+        return self._parse(final=False)
+
+    def close(self):
+        self._buffer += self._text.decode(b'', final=True)
+        items = self._parse(final=True)
+        if self._state == 'document':
+            items.append(json.loads(self._buffer))
+            self._buffer = ''
+        elif self._state != 'done':
+            raise ValueError('Truncated JSON array')
+        return items
+
+    def _parse(self, final):
+        buffer, pos, items = self._buffer, 0, []
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buffer) or self._state == 'document':
+                break
+            char = buffer[pos]
+
+            if self._state == 'start':
+                self.is_array = char == '['
+                if not self.is_array:
+                    self._state = 'document'
+                    break
+                self._state = 'first'
+                pos += 1
+            elif self._state in ('first', 'next') and char == ']':
+                self._state = 'done'
+                pos += 1
+            elif self._state == 'next':
+                if char != ',':
+                    raise ValueError('Expected "," at: {0!r}'.format(buffer[pos:pos + 20]))
+                self._state = 'value'
+                pos += 1
+            elif self._state in ('first', 'value'):
+                try:
+                    item, end = self._decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    if final:
+                        raise
+                    break
+                # A number may go on in the next chunk ("1" then ".5"), so
+                # it is only complete once a delimiter follows it.
+                if not final and buffer[end - 1] not in '}]"' and (
+                        end == len(buffer) or buffer[end] not in _DELIMITERS):
+                    break
+                items.append(item)
+                self._state = 'next'
+                pos = end
+            else:
+                raise ValueError('Extra data after JSON array: {0!r}'.format(buffer[pos:pos + 20]))
+
+        self._buffer = buffer[pos:]
+        return items
@@ -0,0 +1,341 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# A local stand-in for the Harvest API, for tests and benchmarks that should
+# not depend on the network:
+#
+#     with MockHarvestServer(MockDataset(people=40), latency=0.02) as server:
+#         client = Harvest(server.url, 'tester@example.com', 'secret')
+#         client.user_hours(1, '20170101', '20170131')
+#
+# It answers every endpoint Harvest calls with generated, deterministic
+# records. Latency, throttling (429 with Retry-After) and server errors can
+# be injected, and GETs carry an ETag so conditional requests get 304s.
+
+INVOICES_PER_PAGE = 50
+
+_ENTRY_LISTING = re.compile(r'^/(people|projects)/(\d+)/(entries|expenses)$')
+_DAILY_WRITE = re.compile(r'^/daily/(add|update/\d+|delete/\d+)$')
+
+
+class MockDataset(object):
+    # Generated records; sizes are the number of records of each kind, and
+    # entry listings hold `entries_per_day` entries for every day asked for.
+    def __init__(self, clients=30, contacts=60, people=40, projects=150, tasks=25, invoices=500,
+                 expense_categories=10, entries_per_day=4):
+        stamp = '2017-01-01T09:00:00Z'
+        self.clients = [self._record(i, name='Client {0}'.format(i), active=True, currency='USD')
+                        for i in range(1, clients + 1)]
+        self.contacts = [self._record(i, client_id=i % clients + 1, first_name='Contact', last_name=str(i),
+                                      email='contact{0}@example.com'.format(i))
+                         for i in range(1, contacts + 1)]
+        self.people = [self._record(i, email='person{0}@example.com'.format(i), first_name='Person',
+                                    last_name=str(i), is_active=True, is_admin=i == 1, default_hourly_rate=100.0)
+                       for i in range(1, people + 1)]
+        self.projects = [self._record(i, client_id=i % clients + 1, name='Project {0}'.format(i), active=True,
+                                      billable=True, budget=None, hourly_rate=150.0)
+                         for i in range(1, projects + 1)]
+        self.tasks = [self._record(i, name='Task {0}'.format(i), billable_by_default=i % 2 == 0,
+                                   default_hourly_rate=90.0, is_default=False, deactivated=False)
+                      for i in range(1, tasks + 1)]
+        self.invoices = [self._record(i, client_id=i % clients + 1, number=str(1000 + i),
+                                      amount=float(i * 10), due_amount=0.0 if i % 3 else float(i * 10),
+                                      state='paid' if i % 3 else 'open', issued_at='2017-01-15',
+                                      currency='USD')
+                         for i in range(1, invoices + 1)]
+        self.expense_categories = [self._record(i, name='Category {0}'.format(i), deactivated=False)
+                                   for i in range(1, expense_categories + 1)]
+        for record in (self.clients + self.contacts + self.people + self.projects + self.tasks +
+                       self.invoices + self.expense_categories):
+            record.setdefault('created_at', stamp)
+            record.setdefault('updated_at', stamp)
+        self.entries_per_day = entries_per_day
+
+    @staticmethod
+    def _record(record_id, **fields):
+        fields['id'] = record_id
+        return fields
+
+    def entries(self, owner, owner_id, start, end):
+        # Day entries of one person or project between two dates. Ids are
+        # stable, so the same day asked for twice gives the same entries.
+        offset = 0 if owner == 'people' else 2 ** 40
+        records = []
+        day = start
+        while day <= end:
+            for n in range(self.entries_per_day):
+                seq = day.toordinal() * 100 + n
+                user_id = owner_id if owner == 'people' else seq % len(self.people) + 1
+                project_id = owner_id if owner == 'projects' else seq % len(self.projects) + 1
+                records.append({'day_entry': {
+                    'id': offset + seq * 10000 + owner_id,
+                    'spent_at': day.isoformat(),
+                    'hours': (seq % 16 + 1) * 0.25,
+                    'notes': 'Entry {0}'.format(seq),
+                    'user_id': user_id,
+                    'project_id': project_id,
+                    'task_id': seq % len(self.tasks) + 1,
+                    'is_billed': n % 3 == 0,
+                    'is_closed': False,
+                    'timer_started_at': None,
+                    'created_at': '{0}T09:00:00Z'.format(day.isoformat()),
+                    'updated_at': '{0}T17:00:00Z'.format(day.isoformat()),
+                }})
+            day += datetime.timedelta(days=1)
+        return records
+
+
+class MockHarvestServer(object):
+    # `latency` is added to every request, in seconds. `rate_limit` is a
+    # (requests, seconds) window past which requests get a 429, and
+    # `error_rate` the share of requests answered with a 503.
+    def __init__(self, dataset=None, latency=0.0, rate_limit=None, error_rate=0.0, seed=0,
+                 host='127.0.0.1', port=0):
+        self.dataset = dataset or MockDataset()
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = (0.0, 0)
+        self._next_id = 10 ** 9
+        self.request_count = 0
+        self.requests = []
+        self.token_refreshes = 0
+        self._server = _Server((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-harvest')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _admit(self):
+        # Returns (status, retry_after) for throttled or failing requests.
+        with self._lock:
+            self.request_count += 1
+            if self.rate_limit is not None:
+                limit, period = self.rate_limit
+                now = time.monotonic()
+                started, count = self._window
+                if now - started >= period:
+                    started, count = now, 0
+                count += 1
+                self._window = (started, count)
+                if count > limit:
+                    return 429, int(math.ceil(period - (now - started)))
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 503, None
+        return None, None
+
+    def refresh_token(self, form):
+        # The OAuth2 token endpoint; any refresh_token is accepted.
+        if _query_value(form, 'grant_type') != 'refresh_token' or not _query_value(form, 'refresh_token'):
+            return 400, {'error': 'invalid_request'}
+        with self._lock:
+            self.token_refreshes += 1
+            count = self.token_refreshes
+        return 200, {'access_token': 'access-{0}'.format(count), 'refresh_token': 'refresh-{0}'.format(count),
+                     'token_type': 'bearer', 'expires_in': 64799}
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def respond(self, method, path, query, body):
+        # Returns (status, payload) for a request.
+        data = self.dataset
+        collections = {
+            'clients': ('client', data.clients),
+            'contacts': ('contact', data.contacts),
+            'people': ('user', data.people),
+            'projects': ('project', data.projects),
+            'tasks': ('task', data.tasks),
+            'invoices': ('invoices', data.invoices),
+            'expense_categories': ('expense_category', data.expense_categories),
+        }
+
+        if method == 'GET':
+            if path == '/account/who_am_i':
+                return 200, {'company': {'name': 'Example Co', 'base_uri': self.url},
+                             'user': dict(data.people[0])}
+            if path == '/daily':
+                today = datetime.date.today()
+                return 200, {'for_day': today.isoformat(),
+                             'day_entries': [e['day_entry'] for e in data.entries('people', 1, today, today)]}
+            listing = _ENTRY_LISTING.match(path)
+            if listing:
+                owner, owner_id, kind = listing.group(1), int(listing.group(2)), listing.group(3)
+                start, end = _query_date(query, 'from'), _query_date(query, 'to')
+                if start is None or end is None:
+                    return 400, {'message': 'from and to are required'}
+                records = data.entries(owner, owner_id, start, end)
+                if kind == 'expenses':
+                    records = [{'expense': dict(r['day_entry'], total_cost=r['day_entry']['hours'] * 10)}
+                               for r in records[::data.entries_per_day or 1]]
+                return 200, records
+
+        parts = path.strip('/').split('/')
+        if parts[0] not in collections:
+            if method != 'GET' and _DAILY_WRITE.match(path):
+                return self._write(method, parts, body)
+            return 404, {'message': 'Not found'}
+        wrapper, records = collections[parts[0]]
+
+        if method != 'GET':
+            return self._write(method, parts, body)
+        if len(parts) == 1:
+            return 200, _listing(parts[0], wrapper, records, query)
+        if len(parts) == 2 and parts[1].isdigit():
+            record_id = int(parts[1])
+            for record in records:
+                if record['id'] == record_id:
+                    return 200, {wrapper: record}
+        return 404, {'message': 'Not found'}
+
+    def _write(self, method, parts, body):
+        # Writes are acknowledged, not applied: creates answer with the body
+        # and a fresh id, updates echo the body.
+        if method == 'DELETE' or parts[1:2] == ['delete']:
+            return 200, None
+        payload = body if isinstance(body, dict) else {}
+        hours = payload.get('hours')
+        if parts[0] == 'daily' and hours is not None and not (isinstance(hours, (int, float)) and hours >= 0):
+            return 422, {'message': 'Hours must be a positive number'}
+        if method == 'POST' and (parts[-1] == 'add' or len(parts) == 1):
+            return 201, dict(payload, id=self._new_id())
+        return 200, payload
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients giving up on slow responses are expected.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super(_Server, self).handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed
+    # ACKs add ~40ms to every keep-alive request.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        mock = self.server.mock
+        split = urlsplit(self.path)
+        query = parse_qs(split.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        mock.requests.append((self.command, self.path))
+
+        if mock.latency:
+            time.sleep(mock.latency)
+
+        status, retry_after = mock._admit()
+        if status is not None:
+            headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+            return self._send(status, {'message': 'Injected response'}, headers)
+
+        if split.path == '/oauth2/token':
+            return self._send(*mock.refresh_token(parse_qs(raw.decode('utf-8'))))
+        try:
+            body = json.loads(raw.decode('utf-8')) if raw else None
+        except ValueError:
+            return self._send(400, {'message': 'Invalid JSON'})
+        status, payload = mock.respond(self.command, split.path, query, body)
+        self._send(status, payload)
+
+    def _send(self, status, payload, headers=None):
+        content = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        etag = None
+        if self.command == 'GET' and status == 200:
+            etag = '"{0}"'.format(hashlib.md5(content).hexdigest())
+            if self.headers.get('If-None-Match') == etag:
+                status, content = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        if etag:
+            self.send_header('ETag', etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+def _listing(resource, wrapper, records, query):
+    updated_since = _query_value(query, 'updated_since')
+    if updated_since:
+        records = [record for record in records if record['updated_at'] > updated_since]
+    client = _query_value(query, 'client')
+    if client:
+        records = [record for record in records if str(record.get('client_id')) == client]
+    status = _query_value(query, 'status')
+    if status:
+        records = [record for record in records if record.get('state') == status]
+    if resource == 'invoices':
+        page = int(_query_value(query, 'page') or 1)
+        records = records[(page - 1) * INVOICES_PER_PAGE:page * INVOICES_PER_PAGE]
+    return [{wrapper: record} for record in records]
+
+
+def _query_value(query, name):
+    values = query.get(name)
+    return values[0] if values else None
+
+
+def _query_date(query, name):
+    value = _query_value(query, name)
+    if not value:
+        return None
+    return datetime.datetime.strptime(value.replace('-', ''), '%Y%m%d').date()
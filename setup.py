@@ -41,9 +41,10 @@ classifiers = [
     "Intended Audience :: Developers",
     "Natural Language :: English",
     "Operating System :: POSIX :: Linux",
-    "Programming Language :: Python :: 2.7",
-    "Programming Language :: Python :: 3.5",
-    "Programming Language :: Python :: 3.6",
+    "Programming Language :: Python :: 3",
+    "Programming Language :: Python :: 3 :: Only",
+    "Programming Language :: Python :: 3.7",
+    "Programming Language :: Python :: 3.8",
     "Topic :: Software Development :: Libraries",
     "Topic :: Utilities",
     "License :: OSI Approved :: Apache Software License",
@@ -63,5 +64,14 @@ setup(
     packages=find_packages(exclude=['ez_setup', 'examples', 'tests']),
     include_package_data=True,
     zip_safe=True,
-    install_requires=read("requirements.txt").split("\n")
+    python_requires='>=3.7',
+    install_requires=read("requirements.txt").split("\n"),
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson'],
+        'analytics': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': ['harvest = harvest.cli:main'],
+    },
 )
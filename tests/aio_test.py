@@ -0,0 +1,147 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import sys
+import time
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest import aio
+
+if aio.aiohttp is not None:
+    from aiohttp import web
+
+
+@unittest.skipIf(aio.aiohttp is None, "aiohttp is not installed")
+class TestAsyncHarvest(unittest.TestCase):
+    def run_with_server(self, routes, test, max_concurrency=4):
+        async def main():
+            app = web.Application()
+            for path, handler in routes.items():
+                app.router.add_get(path, handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                async with harvest.AsyncHarvest("http://127.0.0.1:{0}".format(port),
+                                                "tester@example.com", "secret",
+                                                max_concurrency=max_concurrency) as client:
+                    return await test(client)
+            finally:
+                await runner.cleanup()
+        return asyncio.run(main())
+
+    def test_endpoints_are_awaitable(self):
+        async def who_am_i(request):
+            return web.json_response({'user': {'email': 'tester@example.com'}})
+
+        async def projects(request):
+            return web.json_response([{'project': {'id': 1}}])
+
+        async def test(client):
+            return await asyncio.gather(client.who_am_i, client.projects())
+
+        me, projects = self.run_with_server({'/account/who_am_i': who_am_i, '/projects': projects}, test)
+        self.assertEqual('tester@example.com', me['user']['email'])
+        self.assertEqual(1, projects[0]['project']['id'])
+
+    def test_concurrency_is_capped(self):
+        state = {'active': 0, 'peak': 0}
+
+        async def people(request):
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+            await asyncio.sleep(0.01)
+            state['active'] -= 1
+            return web.json_response([])
+
+        async def test(client):
+            await asyncio.gather(*[client.people() for _ in range(20)])
+
+        self.run_with_server({'/people': people}, test)
+        self.assertEqual(4, state['peak'])
+
+    def test_deadline_covers_the_wait_for_a_connection(self):
+        async def clients(request):
+            await asyncio.sleep(0.5)
+            return web.json_response([])
+
+        async def test(client):
+            async def call():
+                started = time.monotonic()
+                try:
+                    await client.clients()
+                except harvest.HarvestDeadlineError:
+                    return time.monotonic() - started
+
+            with client.within(0.3):
+                return await asyncio.gather(*[call() for _ in range(3)])
+
+        elapsed = self.run_with_server({'/clients': clients}, test, max_concurrency=1)
+        self.assertEqual(3, len([seconds for seconds in elapsed if seconds is not None and seconds < 0.45]))
+
+    def test_iter_follows_pages(self):
+        async def clients(request):
+            if request.query.get('page') == '2':
+                return web.json_response({'clients': [{'id': 3}], 'next_page': None})
+            return web.json_response({'clients': [{'id': 1}, {'id': 2}], 'next_page': 2})
+
+        async def test(client):
+            return [record['id'] async for record in client.iter_clients()]
+
+        self.assertEqual([1, 2, 3], self.run_with_server({'/clients': clients}, test))
+
+    def test_sharded_range(self):
+        async def entries(request):
+            day = request.query['from']
+            return web.json_response([{'day_entry': {'id': int(day), 'spent_at': day}}])
+
+        async def test(client):
+            return await client.user_hours(7, '20170101', '20170301', window='month')
+
+        hours = self.run_with_server({'/people/7/entries': entries}, test)
+        self.assertEqual([20170101, 20170201, 20170301], [record['day_entry']['id'] for record in hours])
+
+    def test_stream(self):
+        async def entries(request):
+            return web.json_response([{'day_entry': {'id': i}} for i in range(1000)])
+
+        async def test(client):
+            return [record['day_entry']['id'] async for record in client.stream_user_hours(7, '20170101', '20171231')]
+
+        self.assertEqual(list(range(1000)), self.run_with_server({'/people/7/entries': entries}, test))
+
+    def test_hooks_get_connection_timings(self):
+        events = []
+
+        async def people(request):
+            return web.json_response([])
+
+        async def test(client):
+            client.hooks.add('after', events.append)
+            await client.people()
+
+        self.run_with_server({'/people': people}, test)
+        self.assertEqual(200, events[0].status)
+        self.assertEqual('/people', events[0].endpoint)
+        self.assertIn('connect', events[0].timings)
+        self.assertIn('ttfb', events[0].timings)
+
+if __name__ == '__main__':
+    unittest.main()
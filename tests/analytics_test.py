@@ -0,0 +1,75 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from harvest.analytics import EntryTable, np
+from harvest.models import to_models
+
+
+def entry(user_id, project_id, task_id, spent_at, hours):
+    return {'day_entry': {'id': hash((user_id, spent_at, hours)) % 100000, 'user_id': user_id,
+                          'project_id': project_id, 'task_id': task_id, 'spent_at': spent_at, 'hours': hours}}
+
+
+ENTRIES = [
+    entry(1, 10, 100, '2017-01-30', 4.0),
+    entry(1, 10, 101, '2017-01-31', 2.0),
+    entry(1, 11, 100, '2017-02-01', 3.0),
+    entry(2, 10, 101, '2017-02-02', 8.0),
+    entry(2, 11, 100, '2017-02-06', 1.0),
+]
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestEntryTable(unittest.TestCase):
+    def setUp(self):
+        self.table = EntryTable.from_entries(ENTRIES, billable_tasks={100})
+
+    def test_group_by_ids_and_dates(self):
+        self.assertEqual({1: 9.0, 2: 9.0}, self.table.group_by('user').to_dict())
+        self.assertEqual({(10, '2017-01'): 6.0, (10, '2017-02'): 8.0, (11, '2017-02'): 4.0},
+                         self.table.group_by('project', 'month').to_dict())
+        self.assertEqual({'2017-01-30': 17.0, '2017-02-06': 1.0}, self.table.group_by('week').to_dict())
+        self.assertEqual({1: 3, 2: 2}, self.table.group_by('user', value='count').to_dict())
+        self.assertEqual({100: 8.0 / 3, 101: 5.0}, self.table.group_by('task', how='mean').to_dict())
+
+    def test_sparse_groups_match_dense_ones(self):
+        from harvest import analytics
+        dense = self.table.group_by('user', 'project', 'day').to_dict()
+        limit, analytics.DENSE_GROUPS_MAX = analytics.DENSE_GROUPS_MAX, 1
+        try:
+            self.assertEqual(dense, self.table.group_by('user', 'project', 'day').to_dict())
+        finally:
+            analytics.DENSE_GROUPS_MAX = limit
+
+    def test_billable_ratio_and_utilization(self):
+        self.assertEqual(8.0 / 18, self.table.billable_ratio())
+        self.assertEqual({1: 7.0 / 9, 2: 1.0 / 9}, self.table.billable_ratio('user'))
+        self.assertEqual({(1, '2017-01-30'): 7.0 / 40, (2, '2017-02-06'): 1.0 / 40},
+                         self.table.utilization(40))
+        self.assertEqual({(1, '2017-01-30'): 9.0 / 36, (2, '2017-01-30'): 8.0 / 40, (2, '2017-02-06'): 1.0 / 40},
+                         self.table.utilization({1: 36, 2: 40}, billable_only=False))
+
+    def test_between_and_records(self):
+        self.assertEqual(3, len(self.table.between('20170131', '2017-02-02')))
+        table = EntryTable.from_entries(to_models(ENTRIES))
+        self.assertEqual({'2017': 18.0}, table.group_by('year').to_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.testing import MockHarvestServer
+
+
+def entries(count):
+    return [{'notes': 'Imported {0}'.format(i), 'hours': 1.5, 'project_id': 1, 'task_id': 1,
+             'spent_at': '2017-01-02'} for i in range(count)]
+
+
+class TestBatchWrites(unittest.TestCase):
+    def client(self, server):
+        return harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None)
+
+    def test_entries_are_added_concurrently(self):
+        with MockHarvestServer(latency=0.05) as server:
+            report = self.client(server).add_entries(entries(20), user_id=7, max_workers=10)
+            self.assertEqual(20, server.request_count)
+        self.assertTrue(report.ok)
+        self.assertEqual(list(range(20)), [result.index for result in report])
+        self.assertEqual('Imported 3', report[3].result['notes'])
+        self.assertTrue(all(path == '/daily/add?of_user=7' for _, path in server.requests))
+
+    def test_identical_entries_and_failures_are_reported(self):
+        items = entries(3) + entries(1) + [{'notes': 'Bad', 'hours': -1}]
+        with MockHarvestServer() as server:
+            report = self.client(server).add_entries(items)
+            self.assertEqual(5, server.request_count)
+        self.assertEqual(['written'] * 4 + ['failed'], [result.status for result in report])
+        self.assertNotEqual(report[0].result['id'], report[3].result['id'])
+        self.assertIn('422', str(report.failed[0].error))
+        self.assertFalse(report.ok)
+
+    def test_dedupe_skips_identical_entries(self):
+        with MockHarvestServer() as server:
+            report = self.client(server).add_entries(entries(3) + entries(1), dedupe=True)
+            self.assertEqual(3, server.request_count)
+        self.assertEqual(['written'] * 3 + ['skipped'], [result.status for result in report])
+        self.assertEqual(report[0].result, report[3].result)
+
+    def test_ledger_skips_writes_already_made(self):
+        ledger = {}
+        with MockHarvestServer() as server:
+            client = self.client(server)
+            client.add_entries(entries(5)[:3], ledger=ledger)
+            report = client.add_entries(entries(5), ledger=ledger)
+            self.assertEqual(5, server.request_count)
+        self.assertEqual(['skipped'] * 3 + ['written'] * 2, [result.status for result in report])
+        self.assertEqual(5, len(ledger))
+
+    def test_custom_keys(self):
+        with MockHarvestServer() as server:
+            report = self.client(server).update_entries([(1, {'hours': 2}), (1, {'hours': 3})],
+                                                        key=lambda update: update[0])
+        self.assertEqual(['written', 'skipped'], [result.status for result in report])
+
+    def test_async_deletes(self):
+        async def main(url):
+            async with harvest.AsyncHarvest(url, 'tester@example.com', 'secret', rate_limit=None) as client:
+                return await client.delete_entries([1, 2, 3])
+
+        with MockHarvestServer() as server:
+            report = asyncio.run(main(server.url))
+        self.assertEqual(['written'] * 3, [result.status for result in report])
+
+
+if __name__ == '__main__':
+    unittest.main()
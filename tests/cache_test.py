@@ -0,0 +1,67 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from harvest.cache import ResponseCache
+from stubs import FakeClock, StubHarvest, StubResponse
+
+PEOPLE = [{'user': {'id': 1}}]
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_fresh_entries_skip_the_network(self):
+        cache = ResponseCache(ttls={'/people': 60}, clock=FakeClock())
+        client = StubHarvest([StubResponse(200, PEOPLE)], cache=cache)
+        self.assertEqual(PEOPLE, client.people())
+        self.assertEqual(PEOPLE, client.people())
+        self.assertEqual(1, client.stub.calls)
+
+    def test_stale_entries_are_revalidated(self):
+        clock = FakeClock()
+        cache = ResponseCache(ttl=10, clock=clock)
+        client = StubHarvest([StubResponse(200, PEOPLE, {'ETag': '"v1"'}), StubResponse(304)], cache=cache)
+        client.people()
+        clock.now = 11
+        self.assertEqual(PEOPLE, client.people())
+        self.assertEqual({'If-None-Match': '"v1"'}, client.stub.sent[1]['headers'])
+        self.assertTrue(cache.fresh(cache.get(('GET', '/people', client._cache_account()))))
+
+    def test_writes_invalidate_the_resource(self):
+        cache = ResponseCache(ttl=60, clock=FakeClock())
+        client = StubHarvest([StubResponse(200, []), StubResponse(200, []), StubResponse(200, {}),
+                              StubResponse(200, [])], cache=cache)
+        client.projects()
+        client.people()
+        client.update_project(12, project={'name': 'renamed'})
+        self.assertEqual(1, len(cache))
+        client.projects()
+        self.assertEqual(4, client.stub.calls)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(max_entries=2, ttl=60, clock=FakeClock())
+        client = StubHarvest([StubResponse(200, [])] * 3, cache=cache)
+        client.people()
+        client.tasks()
+        client.people()
+        client.projects()
+        account = client._cache_account()
+        self.assertIsNone(cache.get(('GET', '/tasks', account)))
+        self.assertIsNotNone(cache.get(('GET', '/people', account)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import sys
+import time
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest import aio
+from harvest.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, StatusMonitor, endpoint_group
+from harvest.testing import MockDataset, MockHarvestServer
+from stubs import FakeClock
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_and_recovers(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('projects', min_calls=4, window=10, slow_call=1.0, reset_timeout=30, clock=clock)
+        for success, elapsed in [(True, 0.1), (False, None), (True, 0.2), (True, 5.0)]:
+            self.assertIsNone(breaker.allow())
+            breaker.record(success, elapsed)
+        self.assertEqual(OPEN, breaker.state)
+        self.assertEqual(30, breaker.allow())
+
+        clock.now = 31
+        self.assertEqual(HALF_OPEN, breaker.state)
+        self.assertIsNone(breaker.allow())
+        self.assertIsNotNone(breaker.allow())  # one trial call at a time
+        breaker.record(False)
+        self.assertEqual(OPEN, breaker.state)
+
+        clock.now = 62
+        self.assertIsNone(breaker.allow())
+        breaker.record(True, 0.1)
+        self.assertEqual(CLOSED, breaker.state)
+
+    def test_abandoned_trial_call_expires(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('projects', min_calls=1, reset_timeout=30, clock=clock)
+        breaker.record(False)
+        clock.now = 31
+        self.assertIsNone(breaker.allow())  # never reports back
+        clock.now = 45
+        self.assertEqual(16, breaker.allow())
+        clock.now = 61
+        self.assertIsNone(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(CLOSED, breaker.state)
+
+    def test_release_frees_the_trial_call(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('projects', min_calls=1, reset_timeout=30, clock=clock)
+        breaker.record(False)
+        clock.now = 31
+        self.assertIsNone(breaker.allow())
+        breaker.release()
+        self.assertEqual(HALF_OPEN, breaker.state)
+        self.assertIsNone(breaker.allow())
+
+    def test_endpoint_groups(self):
+        self.assertEqual('projects/entries', endpoint_group('/projects/12/entries?from=20170101'))
+        self.assertEqual('clients', endpoint_group('/clients/3'))
+        self.assertEqual('/', endpoint_group('/'))
+
+
+class TestFailFast(unittest.TestCase):
+    def test_deadline_carries_through_retries(self):
+        with MockHarvestServer(MockDataset(clients=2), error_rate=1.0) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None,
+                                     max_retries=50, deadline=0.5)
+            started = time.monotonic()
+            with self.assertRaises(harvest.HarvestDeadlineError):
+                client.clients()
+            self.assertLess(time.monotonic() - started, 0.6)
+
+    def test_within_bounds_slow_requests(self):
+        with MockHarvestServer(MockDataset(clients=2), latency=0.5) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None)
+            with self.assertRaises(harvest.HarvestDeadlineError):
+                with client.within(0.2):
+                    client.clients()
+
+    def test_within_bounds_sharded_requests(self):
+        with MockHarvestServer(MockDataset(people=1), latency=0.5) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None)
+            started = time.monotonic()
+            with self.assertRaises(harvest.HarvestDeadlineError):
+                with client.within(0.2):
+                    client.user_hours(1, '20170101', '20170331', window='month')
+            self.assertLess(time.monotonic() - started, 0.45)
+
+    def test_circuit_opens_per_endpoint_group(self):
+        breakers = CircuitBreakers(min_calls=3, window=5)
+        with MockHarvestServer(MockDataset(clients=2), error_rate=1.0) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None,
+                                     max_retries=0, circuit_breaker=breakers)
+            for _ in range(3):
+                self.assertEqual('Injected response', client.clients()['message'])
+            self.assertEqual({'clients': OPEN}, breakers.states())
+
+            sent = server.request_count
+            with self.assertRaises(harvest.HarvestCircuitOpenError):
+                client.clients()
+            self.assertEqual(sent, server.request_count)
+            client.tasks()
+            self.assertEqual(sent + 1, server.request_count)
+
+    def test_rejects_calls_while_harvest_is_down(self):
+        monitor = StatusMonitor(lambda: {'indicator': 'critical', 'description': 'Major Service Outage'})
+        monitor.refresh()
+        with MockHarvestServer(MockDataset(clients=2)) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None,
+                                     circuit_breaker=CircuitBreakers(monitor=monitor))
+            with self.assertRaises(harvest.HarvestCircuitOpenError):
+                client.clients()
+            self.assertEqual(0, server.request_count)
+            self.assertEqual('critical', client.status['indicator'])
+        monitor.stop()
+
+
+    @unittest.skipIf(aio.aiohttp is None, "aiohttp is not installed")
+    def test_cancelled_calls_do_not_open_the_circuit(self):
+        breakers = CircuitBreakers(min_calls=3, window=5)
+
+        async def main(url):
+            async with harvest.AsyncHarvest(url, 'tester@example.com', 'secret', rate_limit=None,
+                                            circuit_breaker=breakers) as client:
+                for _ in range(10):
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await asyncio.wait_for(client.clients(), 0.05)
+                with client.within(0.01):
+                    await asyncio.sleep(0.02)
+                    with self.assertRaises(harvest.HarvestDeadlineError):
+                        await client.clients()
+
+        with MockHarvestServer(MockDataset(clients=2), latency=0.2) as server:
+            asyncio.run(main(server.url))
+        self.assertEqual({'clients': CLOSED}, breakers.states())
+
+    def test_close_stops_its_own_status_monitor(self):
+        client = harvest.Harvest('https://example.harvestapp.com', 'tester@example.com', 'secret',
+                                 circuit_breaker=True)
+        client.close()
+        self.assertTrue(client.circuit_breaker.monitor._stopped.is_set())
+
+        monitor = StatusMonitor(lambda: {})
+        client = harvest.Harvest('https://example.harvestapp.com', 'tester@example.com', 'secret',
+                                 circuit_breaker=CircuitBreakers(monitor=monitor))
+        client.close()
+        self.assertFalse(monitor._stopped.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
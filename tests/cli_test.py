@@ -0,0 +1,95 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from harvest.cli import main
+from harvest.testing import MockDataset, MockHarvestServer
+from stubs import StubResponse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+class TestCLI(unittest.TestCase):
+    def run_cli(self, server, *argv):
+        out = io.StringIO()
+        env = {'HARVEST_URI': server.url, 'HARVEST_EMAIL': 'tester@example.com', 'HARVEST_PASSWORD': 'secret'}
+        with mock.patch.dict(os.environ, env):
+            self.assertEqual(0, main(list(argv), out=out))
+        return out.getvalue()
+
+    def test_queries(self):
+        with MockHarvestServer(MockDataset(entries_per_day=2, invoices=60)) as server:
+            self.assertIn('"user"', self.run_cli(server, 'who_am_i'))
+            lines = self.run_cli(server, 'user_hours', '3', '20170101', '20170103').splitlines()
+            self.assertEqual(6, len(lines))
+            self.assertEqual('2017-01-01', json.loads(lines[0])['day_entry']['spent_at'])
+            invoices = self.run_cli(server, 'invoices', '--status', 'open').splitlines()
+            self.assertEqual(20, len(invoices))
+
+    def test_missing_credentials(self):
+        with mock.patch.dict(os.environ, {'HARVEST_URI': 'https://example.harvestapp.com'}, clear=True):
+            with mock.patch('sys.stderr', io.StringIO()) as stderr:
+                self.assertEqual(1, main(['who_am_i']))
+        self.assertIn('HARVEST_EMAIL', stderr.getvalue())
+
+    def test_incomplete_credentials(self):
+        for env, missing in [({'HARVEST_EMAIL': 'tester@example.com'}, 'HARVEST_PASSWORD'),
+                             ({'HARVEST_ACCOUNT_ID': '42'}, 'HARVEST_TOKEN')]:
+            env['HARVEST_URI'] = 'https://example.harvestapp.com'
+            with mock.patch.dict(os.environ, env, clear=True):
+                with mock.patch('sys.stderr', io.StringIO()) as stderr:
+                    self.assertEqual(1, main(['who_am_i']))
+            self.assertIn(missing, stderr.getvalue())
+
+    def test_malformed_listing(self):
+        with MockHarvestServer() as server:
+            env = {'HARVEST_URI': server.url, 'HARVEST_EMAIL': 'tester@example.com', 'HARVEST_PASSWORD': 'secret'}
+            with mock.patch.dict(os.environ, env):
+                with mock.patch('harvest.Harvest.stream_user_hours', side_effect=ValueError('Malformed JSON')):
+                    with mock.patch('sys.stderr', io.StringIO()) as stderr:
+                        self.assertEqual(1, main(['user_hours', '3', '20170101', '20170103'], out=io.StringIO()))
+        self.assertIn('Malformed JSON', stderr.getvalue())
+
+    def run_failing(self, server, command):
+        env = {'HARVEST_URI': server.url, 'HARVEST_EMAIL': 'tester@example.com', 'HARVEST_PASSWORD': 'secret'}
+        out = io.StringIO()
+        with mock.patch.dict(os.environ, env), mock.patch('harvest.cli.who_am_i', command):
+            with mock.patch('sys.stderr', io.StringIO()) as stderr:
+                self.assertEqual(1, main(['who_am_i'], out=out))
+        self.assertEqual('', out.getvalue())
+        return stderr.getvalue()
+
+    def test_error_responses(self):
+        with MockHarvestServer() as server:
+            self.assertIn('404', self.run_failing(server, lambda client, args: client._get('/missing')))
+            self.assertIn('not JSON', self.run_failing(server, lambda client, args: StubResponse(200)))
+
+    def test_import_leaves_heavy_dependencies_unloaded(self):
+        code = 'import sys, harvest; print(" ".join(sorted(sys.modules)))'
+        modules = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT).decode('utf-8').split()
+        for name in ('requests', 'requests_oauthlib', 'aiohttp', 'asyncio'):
+            self.assertNotIn(name, modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
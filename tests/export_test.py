@@ -0,0 +1,115 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.export import Exporter, export_invoices, export_user_hours, read_columns
+from harvest.testing import MockDataset, MockHarvestServer
+from stubs import StubHarvest, StubResponse
+
+
+def pieces(count, fail_at=None, after=None):
+    for index in range(count):
+        if after is not None and index <= after:
+            continue
+        if index == fail_at:
+            raise IOError('connection lost')
+        yield index, [{'id': index * 10 + i, 'client': {'name': 'C{0}'.format(index)}} for i in range(3)]
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_interrupted_exports_resume(self):
+        for format in ('csv', 'jsonl', 'columns'):
+            clean = Exporter(self.path('clean.' + format), format, ['id', 'client.name'], chunk_size=2)
+            self.assertEqual(12, clean.run(pieces(4)))
+
+            exporter = Exporter(self.path('out.' + format), format, ['id', 'client.name'], chunk_size=2)
+            with self.assertRaises(IOError):
+                exporter.run(pieces(4, fail_at=2))
+            self.assertEqual(1, exporter.resume_token())
+
+            exporter = Exporter(self.path('out.' + format), format, ['id', 'client.name'], chunk_size=2)
+            self.assertEqual(12, exporter.run(pieces(4, after=exporter.resume_token())))
+            self.assertIsNone(exporter.checkpoint())
+            if format == 'columns':
+                self.assertEqual(list(read_columns(self.path('clean.columns'))),
+                                 list(read_columns(self.path('out.columns'))))
+            else:
+                with open(self.path('clean.' + format)) as a, open(self.path('out.' + format)) as b:
+                    self.assertEqual(a.read(), b.read())
+
+    def test_checkpoint_without_output_starts_over(self):
+        exporter = Exporter(self.path('out.csv'), 'csv', ['id'])
+        with self.assertRaises(IOError):
+            exporter.run(pieces(4, fail_at=2))
+        os.remove(self.path('out.csv'))
+
+        exporter = Exporter(self.path('out.csv'), 'csv', ['id'])
+        self.assertIsNone(exporter.resume_token())
+        self.assertEqual(12, exporter.run(pieces(4, after=exporter.resume_token())))
+        with open(self.path('out.csv')) as f:
+            self.assertEqual(13, len(f.readlines()))
+
+    def test_failed_invoice_page_keeps_the_checkpoint(self):
+        first = [{'invoices': {'id': i}} for i in range(harvest.INVOICES_PER_PAGE)]
+        client = StubHarvest([StubResponse(200, first), StubResponse(503, {'message': 'Injected response'})],
+                             rate_limit=None, max_retries=0)
+        with self.assertRaises(harvest.HarvestError) as raised:
+            export_invoices(client, self.path('invoices.csv'), fields=['id'], chunk_size=10)
+        self.assertIn('503', str(raised.exception))
+        exporter = Exporter(self.path('invoices.csv'), 'csv', ['id'])
+        self.assertEqual(1, exporter.resume_token())
+
+        client = StubHarvest([StubResponse(200, [{'invoices': {'id': 'last'}}])], rate_limit=None)
+        self.assertEqual(harvest.INVOICES_PER_PAGE + 1,
+                         export_invoices(client, self.path('invoices.csv'), fields=['id']))
+        with open(self.path('invoices.csv')) as f:
+            self.assertEqual(harvest.INVOICES_PER_PAGE + 2, len(f.readlines()))
+
+    def test_entries_and_invoices(self):
+        with MockHarvestServer(MockDataset(entries_per_day=2, invoices=120)) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None)
+            self.assertEqual(118, export_user_hours(client, 3, '20170101', '20170228', self.path('hours.csv'),
+                                                    fields=['id', 'spent_at', 'hours']))
+            self.assertEqual(120, export_invoices(client, self.path('invoices.jsonl'), format='jsonl'))
+            self.assertEqual(3, len([path for _, path in server.requests if path.startswith('/invoices')]))
+
+        with open(self.path('hours.csv')) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(['id', 'spent_at', 'hours'], rows[0])
+        self.assertEqual('2017-02-28', rows[-1][1])
+        with open(self.path('invoices.jsonl')) as f:
+            self.assertEqual(1, json.loads(f.readline())['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.fanout import date_windows, fan_out, merge_entries
+from harvest.testing import MockDataset, MockHarvestServer
+from stubs import CannedHarvest, StubHarvest, StubResponse
+
+
+def entry(entry_id, spent_at):
+    return {'day_entry': {'id': entry_id, 'spent_at': spent_at}}
+
+
+class TestDateWindows(unittest.TestCase):
+    def test_months_follow_the_calendar(self):
+        self.assertEqual([('20170115', '20170131'), ('20170201', '20170228'), ('20170301', '20170305')],
+                         date_windows('20170115', '20170305', 'month'))
+
+    def test_weeks_keep_the_input_style(self):
+        self.assertEqual([('2017-01-01', '2017-01-07'), ('2017-01-08', '2017-01-10')],
+                         date_windows('2017-01-01', '2017-01-10', 'week'))
+        self.assertEqual([('2017-01-01', '2017-01-03')],
+                         date_windows(datetime.date(2017, 1, 1), datetime.date(2017, 1, 3), 5))
+
+    def test_rejects_unknown_windows(self):
+        with self.assertRaises(harvest.HarvestError):
+            date_windows('20170101', '20170201', 'fortnight')
+
+
+class TestFanOut(unittest.TestCase):
+    def test_failed_keys_are_retried(self):
+        calls = []
+
+        def flaky(key):
+            calls.append(key)
+            if key == 'b' and calls.count('b') < 2:
+                raise ValueError('boom')
+            return key.upper()
+
+        results = sorted(fan_out(flaky, ['a', 'b'], max_workers=2, retries=1))
+        self.assertEqual([('a', 'A', None), ('b', 'B', None)], results)
+
+    def test_errors_are_reported_per_key(self):
+        def broken(key):
+            raise ValueError(key)
+
+        (key, result, error), = fan_out(broken, ['a'], max_workers=1)
+        self.assertEqual('a', key)
+        self.assertIsNone(result)
+        self.assertIsInstance(error, ValueError)
+
+    def test_merge_drops_duplicates_and_sorts(self):
+        merged = merge_entries([[entry(2, '2017-01-05'), entry(1, '2017-01-01')], [entry(2, '2017-01-05')]])
+        self.assertEqual([1, 2], [record['day_entry']['id'] for record in merged])
+
+
+class TestShardedFetch(unittest.TestCase):
+    def test_user_hours_by_month(self):
+        client = CannedHarvest({
+            '/people/7/entries?from=20170101&to=20170131': [entry(1, '2017-01-10')],
+            '/people/7/entries?from=20170201&to=20170215': [entry(2, '2017-02-03')],
+        })
+        hours = client.user_hours(7, '20170101', '20170215', window='month', max_workers=2)
+        self.assertEqual([1, 2], [record['day_entry']['id'] for record in hours])
+
+    def test_failed_windows_raise(self):
+        client = CannedHarvest({'/projects/3/entries?from=20170101&to=20170107': []})
+        with self.assertRaises(harvest.HarvestError):
+            client.timesheets_for_project(3, '20170101', '20170110', window='week')
+
+    def test_error_responses_are_retried_then_raise(self):
+        client = StubHarvest([StubResponse(503, {'message': 'Injected response'}),
+                              StubResponse(200, [entry(2, '2017-02-03')]),
+                              StubResponse(200, [entry(1, '2017-01-10')])],
+                             rate_limit=None, max_retries=0)
+        hours = client.user_hours(7, '20170101', '20170215', window='month', max_workers=1)
+        self.assertEqual([1, 2], [record['day_entry']['id'] for record in hours])
+
+        with MockHarvestServer(MockDataset(people=1), error_rate=1.0) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None, max_retries=0)
+            with self.assertRaises(harvest.HarvestError) as raised:
+                client.user_hours(1, '20170101', '20171231', window='month')
+            self.assertIn('12 of 12', str(raised.exception))
+
+
+class TestBulkFetch(unittest.TestCase):
+    def test_results_and_errors_per_id(self):
+        client = CannedHarvest({
+            '/people/1/entries?from=20170101&to=20170131': [entry(10, '2017-01-02')],
+            '/people/2/entries?from=20170101&to=20170131': [],
+        })
+        results = dict((user_id, (hours, error))
+                       for user_id, hours, error in client.hours_for_users([1, 2, 3], '20170101', '20170131'))
+        self.assertEqual(([entry(10, '2017-01-02')], None), results[1])
+        self.assertEqual(([], None), results[2])
+        self.assertIsNone(results[3][0])
+        self.assertIsInstance(results[3][1], KeyError)
+
+    def test_error_responses_are_reported_per_id(self):
+        client = StubHarvest([StubResponse(503, {'message': 'Injected response'}),
+                              StubResponse(200, [entry(10, '2017-01-02')])],
+                             rate_limit=None, max_retries=0)
+        results = dict((user_id, (hours, error))
+                       for user_id, hours, error in client.hours_for_users([1, 2], '20170101', '20170131',
+                                                                           max_workers=1))
+        self.assertIsNone(results[1][0])
+        self.assertIsInstance(results[1][1], harvest.HarvestError)
+        self.assertEqual(([entry(10, '2017-01-02')], None), results[2])
+
+    def test_projects(self):
+        client = CannedHarvest({
+            '/projects/{0}/entries?from=20170101&to=20170131'.format(project_id): [entry(project_id, '2017-01-02')]
+            for project_id in range(20)
+        })
+        results = list(client.timesheets_for_projects(range(20), '20170101', '20170131', max_workers=5))
+        self.assertEqual(list(range(20)), sorted(project_id for project_id, _, _ in results))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,7 @@ from time import time
 sys.path.insert(0, sys.path[0]+"/..")
 
 import harvest
+from stubs import CannedHarvest, StubHarvest, StubResponse
 
 class TestHarvest(unittest.TestCase):
     def setUp(self):
@@ -30,5 +31,94 @@ class TestHarvest(unittest.TestCase):
     def test_status_not_down(self):
         self.assertEqual("none", self.harvest.status['indicator'], "Harvest API is having problems")
 
+
+class TestSession(unittest.TestCase):
+    def test_session_is_reused(self):
+        client = harvest.Harvest("https://example.harvestapp.com", "tester@example.com", "secret",
+                                 pool_connections=2, pool_maxsize=5)
+        session = client.session
+        self.assertIs(session, client.session)
+        adapter = session.get_adapter("https://example.harvestapp.com/people")
+        self.assertEqual(5, adapter._pool_maxsize)
+        self.assertEqual(2, adapter._pool_connections)
+        client.close()
+        self.assertIsNot(session, client.session)
+
+    def test_bearer_without_header_uses_query_params(self):
+        client = harvest.Harvest("https://api.harvestapp.com/v2", personal_token="tok", account_id="42",
+                                 put_auth_in_header=False)
+        self.assertEqual({'access_token': 'tok', 'account_id': '42'}, client.session.params)
+        self.assertNotIn('Authorization', client.session.headers)
+
+    def test_keep_alive_disabled(self):
+        client = harvest.Harvest("https://example.harvestapp.com", "tester@example.com", "secret",
+                                 keep_alive=False)
+        self.assertEqual('close', client.session.headers['Connection'])
+
+class TestPagination(unittest.TestCase):
+    def test_invoices_stop_on_short_page(self):
+        full = [{'invoices': {'id': i}} for i in range(harvest.INVOICES_PER_PAGE)]
+        client = CannedHarvest({
+            '/invoices?status=open&page=1': full,
+            '/invoices?status=open&page=2': [{'invoices': {'id': 'last'}}],
+        })
+        records = list(client.iter_invoices(status='open'))
+        self.assertEqual(harvest.INVOICES_PER_PAGE + 1, len(records))
+        self.assertEqual({'id': 'last'}, records[-1]['invoices'])
+        self.assertEqual(['/invoices?status=open&page=1', '/invoices?status=open&page=2'], client.requested)
+
+    def test_follows_next_page_links(self):
+        client = CannedHarvest({
+            '/clients': {'clients': [{'id': 1}, {'id': 2}], 'next_page': 2},
+            '/clients?page=2': {'clients': [{'id': 3}], 'next_page': None},
+        })
+        self.assertEqual([1, 2, 3], [record['id'] for record in client.iter_clients()])
+
+    def test_unpaginated_list_is_fetched_once(self):
+        client = CannedHarvest({'/people': [{'user': {'id': 1}}, {'user': {'id': 2}}]})
+        self.assertEqual(2, len(list(client.iter_people())))
+        self.assertEqual(['/people'], client.requested)
+
+    def test_error_pages_raise(self):
+        for status in (404, 503):
+            client = StubHarvest([StubResponse(200, {'clients': [{'id': 1}], 'next_page': 2}),
+                                  StubResponse(status, {'message': 'Injected response'})],
+                                 rate_limit=None, max_retries=0)
+            with self.assertRaises(harvest.HarvestError) as raised:
+                list(client.iter_clients())
+            self.assertIn(str(status), str(raised.exception))
+
+    def test_page_without_records_raises(self):
+        client = CannedHarvest({'/clients': {'message': 'Injected response'}})
+        with self.assertRaises(harvest.HarvestError):
+            list(client.iter_clients())
+
+
+class TestCodec(unittest.TestCase):
+    def test_plain_dicts_by_default(self):
+        client = StubHarvest([StubResponse(200, {'user': {'id': 1}})], codec='json')
+        me = client.who_am_i
+        self.assertIs(dict, type(me))
+        self.assertIs(dict, type(me['user']))
+
+    def test_json_is_the_default(self):
+        client = StubHarvest([StubResponse(201, {})])
+        self.assertEqual('json', client.codec.name)
+        client.add({'notes': 'x', 1: 'y'})
+        self.assertEqual('{"notes": "x", "1": "y"}', client.stub.sent[0]['data'])
+
+    def test_raw_passthrough(self):
+        client = StubHarvest([StubResponse(200, [{'user': {'id': 1}}])], codec='raw')
+        self.assertEqual(b'[{"user": {"id": 1}}]', client.people())
+
+    def test_request_bodies_use_the_codec(self):
+        client = StubHarvest([StubResponse(201, {})], codec='ordered')
+        client.add({'notes': 'x'})
+        self.assertEqual('{"notes": "x"}', client.stub.sent[0]['data'])
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            harvest.Harvest("https://example.harvestapp.com", "tester@example.com", "secret", codec='yaml')
+
 if __name__ == '__main__':
     unittest.main()
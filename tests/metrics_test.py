@@ -0,0 +1,66 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from harvest.metrics import MetricsCollector, endpoint
+from stubs import StubHarvest, StubResponse
+
+
+class TestHooks(unittest.TestCase):
+    def test_endpoint_templates(self):
+        self.assertEqual('/projects/{id}/entries', endpoint('/projects/12/entries?from=20170101&to=20170131'))
+        self.assertEqual('/daily/{id}/{id}', endpoint('/daily/45/2017'))
+        self.assertEqual('/people', endpoint('/people'))
+
+    def test_every_attempt_is_reported(self):
+        client = StubHarvest([StubResponse(503, {}), StubResponse(200, [{'user': {'id': 1}}])])
+        seen = []
+        client.hooks.add('before', lambda event: seen.append(('before', event.attempt)))
+        client.hooks.add('after', lambda event: seen.append(('after', event.status, event.retries)))
+        client.people()
+        self.assertEqual([('before', 0), ('after', 503, 0), ('before', 1), ('after', 200, 1)], seen)
+
+    def test_unknown_hook(self):
+        client = StubHarvest([])
+        with self.assertRaises(ValueError):
+            client.hooks.add('during', print)
+
+
+class TestMetricsCollector(unittest.TestCase):
+    def test_prometheus_export(self):
+        client = StubHarvest([StubResponse(200, []), StubResponse(201, {'id': 1})], codec='json')
+        metrics = MetricsCollector(buckets=(0.1, 1)).attach(client)
+        client.get_project(12)
+        client.add({'notes': 'x'})
+
+        text = metrics.render()
+        self.assertIn('harvest_requests_total{method="GET",endpoint="/projects/{id}",status="200"} 1', text)
+        self.assertIn('harvest_requests_total{method="POST",endpoint="/daily/add",status="201"} 1', text)
+        self.assertIn('harvest_request_bytes_total{method="POST",endpoint="/daily/add"} 14', text)
+        self.assertIn('harvest_request_duration_seconds_bucket{method="GET",endpoint="/projects/{id}",le="+Inf"} 1',
+                      text)
+        self.assertIn('harvest_requests_in_flight 0', text)
+
+    def test_detach(self):
+        client = StubHarvest([])
+        metrics = MetricsCollector().attach(client)
+        metrics.detach(client)
+        self.assertFalse(client.hooks)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from harvest.mirror import HarvestMirror
+from stubs import StubHarvest, StubResponse
+
+
+def client_record(client_id, updated_at, active=True):
+    return {'client': {'id': client_id, 'name': 'Client {0}'.format(client_id),
+                       'active': active, 'updated_at': updated_at}}
+
+
+class TestHarvestMirror(unittest.TestCase):
+    def test_second_sync_fetches_only_deltas(self):
+        client = StubHarvest([
+            StubResponse(200, [client_record(1, '2017-01-01T00:00:00Z'), client_record(2, '2017-02-01T00:00:00Z')]),
+            StubResponse(200, [client_record(2, '2017-03-01T00:00:00Z', active=False)]),
+        ], rate_limit=None)
+        mirror = HarvestMirror(client, batch_size=1)
+
+        self.assertEqual(2, mirror.sync_resource('clients'))
+        self.assertEqual('2017-02-01T00:00:00Z', mirror.watermark('clients'))
+
+        self.assertEqual(1, mirror.sync_resource('clients'))
+        self.assertTrue(client.stub.sent[1]['url'].endswith('/clients?updated_since=2017-02-01T00:00:00Z'))
+        self.assertEqual('2017-03-01T00:00:00Z', mirror.watermark('clients'))
+        self.assertEqual(2, mirror.count('clients'))
+        self.assertEqual([1], [record['id'] for record in mirror.find('clients', active=True)])
+        self.assertFalse(mirror.get('clients', 2)['active'])
+
+    def test_sync_with_typed_records(self):
+        client = StubHarvest([StubResponse(200, [client_record(1, '2017-01-01T00:00:00Z')])], rate_limit=None,
+                             models=True)
+        mirror = HarvestMirror(client)
+        self.assertEqual(1, mirror.sync_resource('clients'))
+        self.assertEqual('Client 1', mirror.get('clients', 1)['name'])
+        self.assertEqual('2017-01-01T00:00:00Z', mirror.watermark('clients'))
+
+    def test_reset_forgets_watermark(self):
+        client = StubHarvest([StubResponse(200, [client_record(1, '2017-01-01T00:00:00Z')])], rate_limit=None)
+        mirror = HarvestMirror(client)
+        mirror.sync_resource('clients')
+        mirror.reset('clients')
+        self.assertIsNone(mirror.watermark('clients'))
+        self.assertEqual(0, mirror.count('clients'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+from array import array
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+from harvest.models import Project, RecordColumns, Reference, TimeEntry, to_models
+from stubs import CannedHarvest
+
+
+def day_entry(entry_id, hours, **extra):
+    data = {'id': entry_id, 'hours': hours, 'user_id': 5, 'project_id': 9, 'task_id': 2,
+            'spent_at': '2017-01-02', 'notes': 'work'}
+    data.update(extra)
+    return {'day_entry': data}
+
+
+class TestModels(unittest.TestCase):
+    def test_records_use_slots(self):
+        entry = TimeEntry.from_dict(day_entry(1, 2.5))
+        self.assertFalse(hasattr(entry, '__dict__'))
+        self.assertEqual(2.5, entry.hours)
+        self.assertIsNone(entry.timer_started_at)
+
+    def test_unknown_fields_are_kept(self):
+        entry = TimeEntry.from_dict(day_entry(1, 2.5, billable=True))
+        self.assertTrue(entry.billable)
+        self.assertTrue(entry.to_dict()['billable'])
+        with self.assertRaises(AttributeError):
+            entry.missing
+
+    def test_nested_fields_decode_on_access(self):
+        entry = TimeEntry(id=1, project={'id': 9, 'name': 'Website'})
+        self.assertIsInstance(entry._project, dict)
+        self.assertEqual(Reference(id=9, name='Website'), entry.project)
+        self.assertIs(entry.project, entry._project)
+
+    def test_lists_become_columns(self):
+        entries = to_models([day_entry(1, 2.5), day_entry(2, 1)])
+        self.assertIsInstance(entries, RecordColumns)
+        self.assertEqual(array('d', [2.5, 1.0]), entries.column('hours'))
+        self.assertEqual(array('q', [1, 2]), entries.column('id'))
+        self.assertEqual([1, 2], [entry.id for entry in entries])
+        self.assertEqual(2, entries[-1].id)
+
+    def test_columns_with_gaps_stay_lists(self):
+        projects = to_models([{'project': {'id': 1, 'budget': None}}, {'project': {'id': 2, 'budget': 10}}])
+        self.assertEqual([None, 10], projects.column('budget'))
+
+    def test_client_returns_models_when_asked(self):
+        client = CannedHarvest({'/projects/9': {'project': {'id': 9, 'name': 'Website'}},
+                                '/people': [{'user': {'id': 1}}]})
+        client.models = True
+        self.assertIsInstance(client.get_project(9), Project)
+        self.assertEqual([1], [person.id for person in client.iter_people()])
+
+if __name__ == '__main__':
+    unittest.main()
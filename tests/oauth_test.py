@@ -0,0 +1,117 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.oauth import TokenManager
+from harvest.testing import MockHarvestServer
+from stubs import FakeClock
+
+TOKEN = {'token_type': 'bearer', 'access_token': 'a', 'refresh_token': 'r', 'expires_in': 3600}
+
+
+class CountingRefresh(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, token):
+        with self.lock:
+            self.calls += 1
+            count = self.calls
+        time.sleep(self.delay)
+        return {'token_type': 'bearer', 'access_token': 'a{0}'.format(count), 'expires_in': 3600}
+
+
+class TestTokenManager(unittest.TestCase):
+    def test_fresh_tokens_are_left_alone(self):
+        refresh = CountingRefresh()
+        manager = TokenManager(TOKEN, refresh, clock=FakeClock())
+        self.assertEqual('a', manager.ensure_fresh()['access_token'])
+        self.assertEqual(3600, manager.expires_at)
+        self.assertEqual(0, refresh.calls)
+
+    def test_expired_tokens_are_refreshed_before_use(self):
+        clock = FakeClock()
+        saved = []
+        manager = TokenManager(TOKEN, CountingRefresh(), on_refresh=saved.append, clock=clock)
+        clock.now = 3600
+        token = manager.ensure_fresh()
+        self.assertEqual('a1', token['access_token'])
+        self.assertEqual('r', token['refresh_token'])
+        self.assertEqual(7200, token['expires_at'])
+        self.assertEqual([token], saved)
+
+    def test_a_burst_refreshes_once(self):
+        clock = FakeClock()
+        refresh = CountingRefresh(delay=0.05)
+        manager = TokenManager(TOKEN, refresh, clock=clock)
+        clock.now = 4000
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            tokens = list(pool.map(lambda _: manager.ensure_fresh(), range(10)))
+        self.assertEqual(1, refresh.calls)
+        self.assertEqual(['a1'] * 10, [token['access_token'] for token in tokens])
+
+    def test_expiring_tokens_are_refreshed_in_the_background(self):
+        clock = FakeClock()
+        refresh = CountingRefresh(delay=0.05)
+        manager = TokenManager(TOKEN, refresh, margin=300, clock=clock)
+        clock.now = 3400
+        for _ in range(5):
+            self.assertEqual('a', manager.ensure_fresh()['access_token'])
+        while manager.refreshes == 0:
+            time.sleep(0.01)
+        self.assertEqual(1, refresh.calls)
+        self.assertEqual('a1', manager.token['access_token'])
+
+
+# oauthlib refuses plain http, which is all the mock server speaks.
+@mock.patch.dict(os.environ, {'OAUTHLIB_INSECURE_TRANSPORT': '1'})
+class TestOAuthClient(unittest.TestCase):
+    def test_client_refreshes_expired_token(self):
+        saved = []
+        token = dict(TOKEN, expires_at=time.time() - 10)
+        with MockHarvestServer() as server:
+            client = harvest.Harvest(server.url, client_id='id', client_secret='secret', token=token,
+                                     token_updater=saved.append, rate_limit=None)
+            self.assertEqual(1, client.who_am_i['user']['id'])
+            client.people()
+            self.assertEqual(1, server.token_refreshes)
+        self.assertEqual('access-1', client.token['access_token'])
+        self.assertEqual([client.token], saved)
+        self.assertEqual('access-1', client.session.token['access_token'])
+
+    def test_refresh_token_from_the_constructor(self):
+        token = {'token_type': 'bearer', 'access_token': 'a', 'expires_at': time.time() - 10}
+        with MockHarvestServer() as server:
+            client = harvest.Harvest(server.url, client_id='id', client_secret='secret', token=token,
+                                     refresh_token='r-from-ctor', rate_limit=None)
+            self.assertEqual(1, client.who_am_i['user']['id'])
+            self.assertEqual(1, server.token_refreshes)
+        self.assertEqual('access-1', client.token['access_token'])
+        self.assertIn('refresh_token', client.token)
+
+
+if __name__ == '__main__':
+    unittest.main()
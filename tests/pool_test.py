@@ -0,0 +1,114 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.metrics import MetricsCollector
+from harvest.pool import FairScheduler, HarvestPool
+from harvest.testing import MockDataset, MockHarvestServer
+
+
+class TestFairScheduler(unittest.TestCase):
+    def test_waiting_accounts_take_turns(self):
+        scheduler = FairScheduler(1)
+        scheduler.acquire('big')
+        order = []
+        lock = threading.Lock()
+
+        def request(account):
+            with scheduler.slot(account):
+                with lock:
+                    order.append(account)
+
+        threads = []
+        for account in ['big'] * 4 + ['small', 'other']:
+            thread = threading.Thread(target=request, args=(account,))
+            thread.start()
+            threads.append(thread)
+            while sum(scheduler.waiting.values()) < len(threads):
+                time.sleep(0.001)
+        self.assertEqual({'big': 4, 'small': 1, 'other': 1}, scheduler.waiting)
+
+        scheduler.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['big', 'small', 'other', 'big', 'big', 'big'], order)
+        self.assertEqual(0, scheduler.active)
+
+    def test_waiting_gives_up_after_the_timeout(self):
+        scheduler = FairScheduler(1)
+        scheduler.acquire('big')
+        self.assertFalse(scheduler.acquire('small', timeout=0.05))
+        self.assertEqual({}, scheduler.waiting)
+        scheduler.release()
+        self.assertTrue(scheduler.acquire('small', timeout=0.05))
+
+
+class TestHarvestPool(unittest.TestCase):
+    def test_accounts_share_connections(self):
+        with MockHarvestServer(MockDataset(clients=3)) as server:
+            with HarvestPool(server.url, max_connections=4, rate_limit=(50, 1)) as pool:
+                for account_id in range(1, 6):
+                    pool.client(account_id, 'token-{0}'.format(account_id))
+                results = dict((account_id, len(result)) for account_id, result, error in
+                               pool.each(lambda client: client.clients()))
+
+                self.assertEqual(dict.fromkeys(range(1, 6), 3), results)
+                self.assertIs(pool[1].session.get_adapter(server.url), pool[2].session.get_adapter(server.url))
+                self.assertIsNot(pool[1].rate_limiter, pool[2].rate_limiter)
+                self.assertEqual(dict.fromkeys(range(1, 6), 1), dict(pool.scheduler.granted))
+
+                pool.remove(1)
+                self.assertEqual(3, len(pool[2].clients()))
+                self.assertEqual([2, 3, 4, 5], pool.accounts)
+                with self.assertRaises(harvest.HarvestError):
+                    pool.client(1)
+
+    def test_waiting_for_a_slot_counts_against_the_deadline(self):
+        with MockHarvestServer() as server:
+            with HarvestPool(server.url, max_connections=1, rate_limit=None) as pool:
+                client = pool.client(1, 'token-1')
+                pool.scheduler.acquire(2)
+                start = time.monotonic()
+                with self.assertRaises(harvest.HarvestDeadlineError):
+                    with client.within(0.2):
+                        client.who_am_i
+                self.assertLess(time.monotonic() - start, 0.4)
+                self.assertEqual({}, pool.scheduler.waiting)
+                pool.scheduler.release()
+                self.assertEqual(0, pool.scheduler.active)
+
+    def test_requests_out_of_time_are_reported_as_errors(self):
+        metrics = MetricsCollector()
+        with MockHarvestServer() as server:
+            with HarvestPool(server.url, max_connections=1, rate_limit=None) as pool:
+                client = pool.client(1, 'token-1')
+                metrics.attach(client)
+                pool.scheduler.acquire(2)
+                with self.assertRaises(harvest.HarvestDeadlineError):
+                    with client.within(0.2):
+                        client.who_am_i
+                pool.scheduler.release()
+        self.assertEqual(0, metrics.in_flight)
+        self.assertEqual(['HarvestDeadlineError'], [key[-1] for key in metrics.errors])
+
+
+if __name__ == '__main__':
+    unittest.main()
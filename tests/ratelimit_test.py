@@ -0,0 +1,69 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.ratelimit import RateLimiter, parse_retry_after
+from stubs import FakeClock, StubHarvest, StubResponse
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_paced(self):
+        clock = FakeClock()
+        limiter = RateLimiter(2, 1, clock=clock)
+        self.assertEqual(0, limiter.reserve())
+        self.assertEqual(0, limiter.reserve())
+        self.assertAlmostEqual(0.5, limiter.reserve())
+        self.assertAlmostEqual(1.0, limiter.reserve())
+        self.assertEqual(2, limiter.queue_depth)
+        self.assertEqual(0, limiter.budget)
+        clock.now = 3.0
+        self.assertEqual(2, limiter.budget)
+        self.assertEqual(0, limiter.queue_depth)
+
+    def test_pause_holds_back_reservations(self):
+        clock = FakeClock()
+        limiter = RateLimiter(10, 1, clock=clock)
+        limiter.pause(5)
+        self.assertEqual(0, limiter.budget)
+        self.assertAlmostEqual(5.1, limiter.reserve())
+
+    def test_parse_retry_after(self):
+        self.assertEqual(7.0, parse_retry_after('7'))
+        self.assertEqual(0.0, parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class TestRetries(unittest.TestCase):
+    def test_throttled_request_is_retried(self):
+        client = StubHarvest([StubResponse(429, headers={'Retry-After': '0'}), StubResponse(200, {'ok': True})])
+        self.assertEqual({'ok': True}, client._get('/people'))
+        self.assertEqual(2, client.stub.calls)
+
+    def test_gives_up_after_max_retries(self):
+        client = StubHarvest([StubResponse(429, headers={'Retry-After': '0'})] * 2, max_retries=1)
+        with self.assertRaises(harvest.HarvestRateLimitError):
+            client._get('/people')
+
+    def test_server_errors_are_not_retried_for_writes(self):
+        client = StubHarvest([StubResponse(503, {'error': 'down'})], rate_limit=None)
+        self.assertEqual({'error': 'down'}, client._post('/daily/add', {}))
+        self.assertEqual(1, client.stub.calls)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.reconcile import Reconciler, diff
+from harvest.testing import MockDataset, MockHarvestServer
+
+
+class TestDiff(unittest.TestCase):
+    def test_only_changed_fields(self):
+        current = {'id': 1, 'name': 'A', 'active': True, 'address': {'city': 'X', 'zip': '1'}}
+        self.assertIsNone(diff(current, {'name': 'A', 'active': True}))
+        self.assertEqual({'name': 'B', 'address': {'zip': '2'}},
+                         diff(current, {'name': 'B', 'address': {'city': 'X', 'zip': '2'}}))
+        self.assertEqual({'active': 1}, diff(current, {'active': 1}))
+        self.assertEqual({'notes': None}, diff(current, {'notes': None}))
+
+
+class TestReconciler(unittest.TestCase):
+    def test_unchanged_records_are_skipped(self):
+        with MockHarvestServer(MockDataset(clients=5)) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None)
+            reconciler = Reconciler(client)
+            reconciler.remember('client', client.clients())
+            for record in client.clients():
+                desired = dict(record['client'])
+                if desired['id'] == 3:
+                    desired['name'] = 'Renamed'
+                reconciler.update_client(desired['id'], client=desired)
+            reconciler.update_client(3, client={'name': 'Renamed'})
+            self.assertEqual([('PUT', '/clients/3')], [r for r in server.requests if r[0] == 'PUT'])
+
+        self.assertEqual(1, len(reconciler.report.written))
+        self.assertEqual({'name': 'Renamed'}, reconciler.report.written[0].fields)
+        self.assertEqual(5, len(reconciler.report.skipped))
+
+    def test_unknown_records_are_fetched(self):
+        with MockHarvestServer() as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None)
+            reconciler = Reconciler(client)
+            self.assertIsNone(reconciler.update_task(2, name='Task 2'))
+            reconciler.update_task(2, name='Task two')
+            self.assertEqual([('GET', '/tasks/2'), ('PUT', '/tasks/2')], server.requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.refstore import ReferenceStore
+from harvest.testing import MockDataset, MockHarvestServer
+
+
+class TestReferenceStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'refs.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lookups(self):
+        dataset = MockDataset(people=5, projects=300, tasks=8, clients=4, expense_categories=3)
+        with MockHarvestServer(dataset) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None)
+            with ReferenceStore(self.path) as store:
+                self.assertIsNone(store.name('projects', 1))
+                fetched = store.refresh(client)
+        self.assertEqual(300, fetched['projects'])
+
+        with ReferenceStore(self.path) as store:
+            self.assertEqual('Person 3', store.name('people', 3))
+            self.assertEqual('Project 277', store.name('projects', 277))
+            self.assertEqual(['Task 1', None], store.names('tasks', [1, 99]))
+            self.assertEqual('Category 2', store.name('expense_categories', 2))
+            self.assertEqual('?', store.name('clients', 12, default='?'))
+            self.assertEqual(2, store.get('projects', 1)['client_id'])
+            self.assertIn(('clients', 4), store)
+            self.assertEqual(300, store.count('projects'))
+
+    def test_incremental_refresh(self):
+        dataset = MockDataset(tasks=6, clients=4)
+        with MockHarvestServer(dataset) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None)
+            store = ReferenceStore(self.path)
+            store.refresh(client, ['tasks', 'clients'])
+            reader = ReferenceStore(self.path)
+
+            dataset.tasks[2].update(name='Design', updated_at='2017-03-01T09:00:00Z')
+            fetched = store.refresh(client, ['tasks'])
+            self.assertEqual(1, fetched['tasks'])
+            self.assertIn('updated_since=2017-01-01T09:00:00Z', server.requests[-1][1])
+
+        # Another reader keeps its snapshot until it reloads.
+        self.assertEqual('Task 3', reader.name('tasks', 3))
+        self.assertTrue(reader.reload())
+        self.assertEqual('Design', reader.name('tasks', 3))
+        self.assertEqual('Task 4', reader.name('tasks', 4))
+        self.assertEqual('Client 2', reader.name('clients', 2))
+        self.assertEqual('2017-03-01T09:00:00Z', reader.watermark('tasks'))
+        self.assertFalse(reader.reload())
+        reader.close()
+        store.close()
+
+    def test_failed_refresh_keeps_the_snapshot(self):
+        with MockHarvestServer(MockDataset(people=3)) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None, max_retries=0)
+            with ReferenceStore(self.path) as store:
+                store.refresh(client)
+                server.error_rate = 1.0
+                with self.assertRaises(harvest.HarvestError):
+                    store.refresh(client)
+                self.assertFalse(store.reload())
+                self.assertEqual(3, store.count('people'))
+                self.assertEqual('Person 1', store.name('people', 1))
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a store at all')
+        with self.assertRaises(harvest.HarvestError):
+            ReferenceStore(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.singleflight import AsyncSingleFlight, SingleFlight
+from harvest.testing import MockHarvestServer
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            release.wait()
+            return 'result'
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(flight.do, 'key', work) for _ in range(5)]
+            while flight.coalesced < 4:
+                time.sleep(0.001)
+            release.set()
+            self.assertEqual(['result'] * 5, [future.result() for future in futures])
+        self.assertEqual(1, len(calls))
+        self.assertEqual(0, len(flight))
+
+    def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('key', lambda: int('x'))
+        self.assertEqual(3, flight.do('key', lambda: 3))
+
+    def test_async_calls_share_one_task(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'result'
+
+        async def main():
+            return await asyncio.gather(*[flight.do('key', work) for _ in range(5)])
+
+        self.assertEqual(['result'] * 5, asyncio.run(main()))
+        self.assertEqual(1, len(calls))
+        self.assertEqual(0, len(flight))
+
+
+class TestCoalescedClient(unittest.TestCase):
+    def test_threads_share_identical_gets(self):
+        with MockHarvestServer(latency=0.3) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None, coalesce=True)
+            with ThreadPoolExecutor(max_workers=10) as pool:
+                results = list(pool.map(lambda _: client.people(), range(10)))
+            self.assertTrue(all(result == results[0] for result in results))
+            self.assertEqual(1, server.request_count)
+
+    def test_different_paths_are_not_shared(self):
+        with MockHarvestServer() as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None, coalesce=True)
+            client.people()
+            client.projects()
+            self.assertEqual(2, server.request_count)
+
+    def test_followers_keep_their_own_deadline(self):
+        with MockHarvestServer(latency=1.0) as server:
+            client = harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None, coalesce=True)
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                leader = pool.submit(client.people)
+                while not len(client.single_flight):
+                    time.sleep(0.001)
+                started = time.monotonic()
+                with self.assertRaises(harvest.HarvestDeadlineError):
+                    with client.within(0.2):
+                        client.people()
+                self.assertLess(time.monotonic() - started, 0.5)
+                self.assertIsInstance(leader.result(), list)
+            self.assertEqual(1, server.request_count)
+
+    def test_async_followers_keep_their_own_deadline(self):
+        async def main(url):
+            async with harvest.AsyncHarvest(url, 'tester@example.com', 'secret', rate_limit=None,
+                                            coalesce=True) as client:
+                leader = asyncio.ensure_future(client.people())
+                await asyncio.sleep(0.05)
+                with self.assertRaises(harvest.HarvestDeadlineError):
+                    with client.within(0.2):
+                        await client.people()
+                return await leader
+
+        with MockHarvestServer(latency=0.5) as server:
+            self.assertIsInstance(asyncio.run(main(server.url)), list)
+            self.assertEqual(1, server.request_count)
+
+    def test_async_tasks_share_identical_gets(self):
+        async def main(url):
+            async with harvest.AsyncHarvest(url, 'tester@example.com', 'secret', rate_limit=None,
+                                            coalesce=True) as client:
+                return await asyncio.gather(*[client.people() for _ in range(10)])
+
+        with MockHarvestServer(latency=0.1) as server:
+            results = asyncio.run(main(server.url))
+            self.assertEqual(10, len(results))
+            self.assertEqual(1, server.request_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
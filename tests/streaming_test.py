@@ -0,0 +1,83 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.streaming import JSONArrayParser
+from stubs import StubHarvest, StubResponse
+
+
+def parse(document, chunk_size):
+    parser = JSONArrayParser()
+    items = []
+    for start in range(0, len(document), chunk_size):
+        items.extend(parser.feed(document[start:start + chunk_size]))
+    items.extend(parser.close())
+    return parser, items
+
+
+class TestJSONArrayParser(unittest.TestCase):
+    def test_any_chunking_gives_the_same_items(self):
+        expected = [{'day_entry': {'id': i, 'notes': u'café ☃', 'hours': i * 0.5}} for i in range(50)]
+        expected += [12345, "tail", None, [1, [2]]]
+        document = json.dumps(expected).encode('utf-8')
+        for chunk_size in (1, 2, 7, 64, len(document)):
+            parser, items = parse(document, chunk_size)
+            self.assertEqual(expected, items)
+            self.assertTrue(parser.is_array)
+
+    def test_numbers_split_across_chunks(self):
+        expected = [1.5, -2.25e3, 1e5, 7, 0.125]
+        document = b'[1.5, -2.25e3,1E+5 ,7,0.125]'
+        for chunk_size in range(1, len(document) + 1):
+            self.assertEqual(expected, parse(document, chunk_size)[1])
+        parser = JSONArrayParser()
+        self.assertEqual([], parser.feed(b'[1.'))
+        self.assertEqual([1.5], parser.feed(b'5]'))
+
+    def test_items_arrive_before_the_end(self):
+        parser = JSONArrayParser()
+        self.assertEqual([{'id': 1}], parser.feed(b'[{"id": 1}, {"id": '))
+        self.assertEqual([{'id': 2}], parser.feed(b'2}]'))
+        self.assertEqual([], parser.close())
+
+    def test_other_documents_are_returned_whole(self):
+        parser, items = parse(b'{"time_entries": [{"id": 1}]}', 4)
+        self.assertFalse(parser.is_array)
+        self.assertEqual([{'time_entries': [{'id': 1}]}], items)
+
+    def test_truncated_array(self):
+        with self.assertRaises(ValueError):
+            parse(b'[{"id": 1}, {"id"', 3)
+
+
+class TestStreamingEndpoints(unittest.TestCase):
+    def test_stream_user_hours(self):
+        entries = [{'day_entry': {'id': i}} for i in range(100)]
+        client = StubHarvest([StubResponse(200, entries)])
+        self.assertEqual(entries, list(client.stream_user_hours(1, '20170101', '20171231')))
+        self.assertTrue(client.stub.sent[0]['stream'])
+
+    def test_error_status_raises(self):
+        client = StubHarvest([StubResponse(404, {'message': 'not found'})])
+        with self.assertRaises(harvest.HarvestError):
+            list(client.stream_timesheets_for_project(1, '20170101', '20171231'))
+
+if __name__ == '__main__':
+    unittest.main()
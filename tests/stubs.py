@@ -0,0 +1,93 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import json
+import sys
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+
+# Stand-ins for the HTTP session, for tests that exercise _request
+# without a network.
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubResponse(object):
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {'Content-Type': 'application/json'}
+        self.headers.update(headers or {})
+        self.elapsed = datetime.timedelta(milliseconds=20)
+
+    @property
+    def content(self):
+        return json.dumps(self.body).encode('utf-8')
+
+    def json(self, **kwargs):
+        return self.body
+
+    def iter_content(self, chunk_size=1):
+        content = self.content
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class StubSession(object):
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self.sent = []
+
+    def request(self, **kwargs):
+        self.calls += 1
+        self.sent.append(kwargs)
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+class StubHarvest(harvest.Harvest):
+    def __init__(self, responses, **kwargs):
+        super(StubHarvest, self).__init__("https://example.harvestapp.com", "tester@example.com", "secret",
+                                          **kwargs)
+        self.stub = StubSession(responses)
+
+    def _build_session(self):
+        return self.stub
+
+
+class CannedHarvest(harvest.Harvest):
+    # Answers GETs from a dict of path -> response instead of the network.
+    def __init__(self, responses):
+        super(CannedHarvest, self).__init__("https://example.harvestapp.com", "tester@example.com", "secret")
+        self.responses = responses
+        self.requested = []
+
+    def _request(self, method='GET', path='/', data=None, check=False):
+        self.requested.append(path)
+        return self.responses[path]
@@ -0,0 +1,71 @@
+# Copyright 2012-2017 Lionheart Software LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+sys.path.insert(0, sys.path[0]+"/..")
+
+import harvest
+from harvest.cache import ResponseCache
+from harvest.testing import MockDataset, MockHarvestServer
+
+
+class TestMockHarvestServer(unittest.TestCase):
+    def client(self, server, **kwargs):
+        return harvest.Harvest(server.url, 'tester@example.com', 'secret', rate_limit=None, **kwargs)
+
+    def test_listings_and_records(self):
+        with MockHarvestServer(MockDataset(clients=3)) as server:
+            client = self.client(server)
+            self.assertEqual(3, len(client.clients()))
+            self.assertEqual('Client 2', client.get_client(2)['client']['name'])
+            self.assertEqual(1, client.who_am_i['user']['id'])
+
+    def test_entry_listings_cover_the_date_range(self):
+        with MockHarvestServer(MockDataset(entries_per_day=2)) as server:
+            entries = self.client(server).user_hours(7, '20170101', '20170110')
+        self.assertEqual(20, len(entries))
+        self.assertTrue(all(entry['day_entry']['user_id'] == 7 for entry in entries))
+
+    def test_invoices_are_paginated(self):
+        with MockHarvestServer(MockDataset(invoices=120)) as server:
+            invoices = list(self.client(server).iter_invoices())
+            self.assertEqual(120, len(invoices))
+            self.assertEqual(3, server.request_count)
+
+    def test_injected_errors_are_retried(self):
+        with MockHarvestServer(error_rate=0.5, seed=3) as server:
+            client = self.client(server, max_retries=10)
+            for _ in range(5):
+                client.who_am_i
+            self.assertGreater(server.request_count, 5)
+
+    def test_throttled_requests_wait_for_retry_after(self):
+        with MockHarvestServer(rate_limit=(2, 1)) as server:
+            client = self.client(server)
+            for _ in range(3):
+                client.who_am_i
+            self.assertEqual(4, server.request_count)
+
+    def test_conditional_requests_are_not_modified(self):
+        with MockHarvestServer() as server:
+            client = self.client(server, cache=ResponseCache(ttl=0))
+            first = client.people()
+            self.assertEqual(first, client.people())
+        self.assertEqual(2, server.request_count)
+
+
+if __name__ == '__main__':
+    unittest.main()